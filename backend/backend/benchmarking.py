@@ -0,0 +1,74 @@
+import json
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+# Shared helpers for the benchmark management commands
+
+def time_calls(func, iterations, warmup=None):
+    # Calls func `iterations` times and returns throughput and latency percentiles
+    for _ in range(warmup if warmup is not None else min(iterations, 100)):
+        func()
+
+    timings = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        start = clock()
+        func()
+        timings.append(clock() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 1) if total else None,
+        'mean_us': round(total / iterations * 1e6, 2),
+        'p50_us': round(percentile(timings, 50) * 1e6, 2),
+        'p99_us': round(percentile(timings, 99) * 1e6, 2),
+    }
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+def format_stats(stats):
+    return f"{stats['ops_per_sec']} ops/s p50={stats['p50_us']}us p99={stats['p99_us']}us"
+
+@contextmanager
+def throwaway_database():
+    # Points the default connection at a fresh test database for the benchmark to seed, so the
+    # real one is never touched, and destroys it afterwards
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path, benchmark, results):
+    # Writes results as JSON along with enough context to compare runs between commits
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'benchmark': benchmark,
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'results': results,
+    }, indent=2))
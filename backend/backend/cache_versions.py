@@ -0,0 +1,24 @@
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+# Version stamps for things built from the database and kept in the cache or in memory. Whatever
+# is built stores or is keyed by the stamp it was built under, and is rebuilt once the stamp
+# changes. Stamps live in the configured cache, so other processes only see a change when that
+# cache is shared between them (Redis, Memcached). The default LocMemCache is per process, so
+# there each process only notices changes it made itself
+
+def get_version(version_key):
+    # Random rather than a counter so that if a stamp gets evicted the new one can't match
+    # anything built under an old one
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(version_key, version, None)
+    return version
+
+def invalidate_version(version_key):
+    # Dropped again after commit, so anything built from the old rows mid-transaction can't keep
+    # the old stamp
+    cache.delete(version_key)
+    transaction.on_commit(lambda: cache.delete(version_key))
@@ -0,0 +1,30 @@
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+def get_table_version(queryset):
+    # Returns (version, last modified timestamp) for a table with an updated_at column. Saves move
+    # the latest updated_at and deletes change the count, so between them the version changes
+    # whenever the rows do. It is one aggregate query instead of serializing every row
+    stats = queryset.aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+    last_modified = stats['last_modified'].timestamp() if stats['last_modified'] else 0
+    return f"{stats['count']}-{last_modified:.6f}", int(last_modified)
+
+def conditional_list_response(request, queryset, serializer_class):
+    # Serializes the queryset into a 200, or returns a 304 if the client's ETag is still current
+    version, last_modified = get_table_version(queryset)
+    # JSON and the browsable API render the same rows differently so they get different tags
+    etag = quote_etag(f"{request.accepted_renderer.format}-{version}")
+
+    # Only the ETag decides, as Last-Modified can't see deletes and would let a stale copy through
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        serializer = serializer_class(queryset, many=True)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
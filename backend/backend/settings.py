@@ -102,6 +102,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory cache by default, it drops the least recently used entries when full. It is per
+# process, so the version stamps in backend/cache_versions.py only reach other processes once
+# this points at a shared cache such as Redis or Memcached
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,4 +160,16 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
-]
\ No newline at end of file
+]
+# Score hands with exact fractions instead of floats. Off by default as turning it on
+# can raise some scores by 1 and so shift existing challenge targets
+GAME_EXACT_SCORING = False
+# Rarity drop tables for monster spawns and pulls. 'default' is used unless the monster type has
+# a 'type:<type>' table, or a pull asks for an 'event:<name>' table. Weights are relative. Pity
+# guarantees a rarity within that many pulls (counted per user and table, pulls only)
+MONSTER_DROP_TABLES = {
+    'default': {
+        'weights': {'C': 0.6, 'R': 0.25, 'E': 0.1, 'L': 0.05},
+        'pity': {'E': 20, 'L': 90},
+    },
+}
@@ -1,77 +1,143 @@
+import heapq
+from math import gcd
+from django.conf import settings
+
+# One bit per monster type, the types in a hand are combined into a bitmask
+TYPE_BITS = {
+    'F&D': 1,
+    'HWB': 2,
+    'W': 4,
+    'WA': 8,
+    'N&B': 16,
+    'E': 32,
+}
+
+# Exact versions of the float multipliers as (numerator, denominator) pairs, by hand size.
+# Water is max(1.5 * (5 - n), 1) and nature is 1.2 ** n
+WATER_MULTIPLIERS = {hand_size: (max(3 * (5 - hand_size), 2), 2) for hand_size in range(6)}
+BIO_DIVERSITY_MULTIPLIERS = {hand_size: (6 ** hand_size, 5 ** hand_size) for hand_size in range(6)}
+
 class GameScoreCalculator:
 
+    def __init__(self, exact=None):
+        # Exact mode scores with integer fractions so results don't depend on float rounding.
+        # It is off by default because some scores come out 1 higher than the float version,
+        # which would make existing challenges easier without anyone noticing
+        if exact is None:
+            exact = getattr(settings, 'GAME_EXACT_SCORING', False)
+        self.exact = exact
+
     def validate_monsters(self, monsters):
         # Check that the hand size is between 1 and 5
         if not monsters:
             return False
         if len(monsters) > 5:
             return False
-        
+
         # Check that there are no duplicate monsters
         monster_ids = [monster.id for monster in monsters]
         if len(monster_ids) != len(set(monster_ids)):
             return False
-        
+
         return True
-        
+
     def calculate_score(self, monsters):
         # given a list of monsters, returns an integer score based on different synergies and the sum of the levels
 
         if not monsters or not self.validate_monsters(monsters):
             return 0
-        
-        # These are the multipliers for each type
-        bio_diversity_multiplier = 1.2
-        well_being_multiplier = 20
-        water_multiplier = 1.5
-
-        score = 0
-        multiplier = 1
-
-        monster_levels = [monster.level for monster in monsters]
-        types_in_play = [monster.monster.type for monster in monsters]
-
-        # Water synergy - adds a multiplier proportional to number of missing monsters
-        if 'W' in types_in_play:
-            multiplier = max((water_multiplier * (5 - len(monsters))),1) # if a 5 monsters played this will make multiplier = 0, so normalise to 1
-
-        # Energy synergy - each energy card is doubled if not playing 5 monsters
-        if 'E' in types_in_play:
-
-            energy_cards = [monster for monster in monsters if monster.monster.type == 'E']
-            if len(monster_levels) < 5:
-                for energy_card in energy_cards:
-                    monster_levels.remove(energy_card.level)
-                    monster_levels.append(energy_card.level * 2)
-
-        # Food synergy - if food and drinak AND waste are in play, double score of all food cards
-        if 'WA' in types_in_play and 'F&D' in types_in_play:
-           
-            food_cards = [monster for monster in monsters if monster.monster.type == 'F&D']
-            for food_card in food_cards:
-                monster_levels.remove(food_card.level)
-                monster_levels.append(food_card.level * 2)
-           
-        # Waste synergy - for any waste monsters in play, swap the lowest level monster with that waste monster's score
-        if 'WA' in types_in_play:
-            waste_cards = [monster for monster in monsters if monster.monster.type == 'WA']
-            for waste_card in waste_cards:
-                min_level = min(monster_levels)
-                monster_levels.remove(min_level)
-                monster_levels.append(waste_card.level)
-
-        # Nature synergy - if at least one of the monsters is nature&biodiversity, add a multiplier to all scores based on the number of types in play
-        if 'N&B' in types_in_play:
-            multiplier *= bio_diversity_multiplier ** len(types_in_play)
-
-        # Health synergy - If at least one of the monster is health & well being, add a flat rate to each score
-        if 'HWB' in types_in_play:
-            score += len(monsters) * well_being_multiplier
-
-        for level in monster_levels:
-            score += level
-
-        # Converting float to int might change expected score so we need to look at this later
+
+        hand = [(monster.monster.type, monster.level) for monster in monsters]
+        return self.score_hand(hand)
+
+    def calculate_scores(self, hands):
+        # Batch mode - scores many hands in one call. Each hand is a compact list of
+        # (type, level) pairs instead of PlayerMonster objects, so no ORM access is needed.
+        # Duplicates can't be spotted in this form so callers must dedupe by monster id first
+        return [self.score_hand(hand) if 0 < len(hand) <= 5 else 0 for hand in hands]
+
+    def score_hand(self, hand):
+        # Scores one hand of (type, level) pairs that has already been validated.
+        # The synergies only depend on which types are in play and the hand size, so they
+        # come from SYNERGY_TABLE and all that is left to do per hand is work out the levels
+        type_mask = 0
+        for monster_type, _ in hand:
+            type_mask |= TYPE_BITS.get(monster_type, 0)
+        multiplier, exact_multiplier, flat_bonus, doubled_mask, has_waste = SYNERGY_TABLE[(type_mask, len(hand))]
+
+        monster_levels = [
+            level * 2 if TYPE_BITS.get(monster_type, 0) & doubled_mask else level
+            for monster_type, level in hand
+        ]
+
+        # Waste synergy - each waste monster replaces the current lowest level with its own level.
+        # Lowest waste level first, which always scores best, so the order the cards are given
+        # in doesn't change the score
+        if has_waste:
+            heapq.heapify(monster_levels)
+            for level in sorted(level for monster_type, level in hand if monster_type == 'WA'):
+                heapq.heapreplace(monster_levels, level)
+
+        score = flat_bonus + sum(monster_levels)
+        if self.exact:
+            numerator, denominator = exact_multiplier
+            return score * numerator // denominator
+
+        # Converting float to int can round down exact results (e.g. 107.99999999999999), see exact mode
         return int(score * multiplier)
 
-    
\ No newline at end of file
+
+def build_synergy_table():
+    # Works out the synergies for every (bitmask of types in play, hand size) pair.
+    # How many monsters of each type are played only matters through the hand size,
+    # so this covers every possible multiset of types in 64 * 5 entries.
+    # Each entry is (float multiplier, exact multiplier as (numerator, denominator), flat bonus,
+    # bitmask of types whose levels double, waste in play)
+
+    # These are the multipliers for each type
+    bio_diversity_multiplier = 1.2
+    well_being_multiplier = 20
+    water_multiplier = 1.5
+
+    table = {}
+    for type_mask in range(1 << len(TYPE_BITS)):
+        in_play = {monster_type for monster_type, bit in TYPE_BITS.items() if type_mask & bit}
+
+        # Hands can also hold monsters of unknown types, which have no bit
+        for hand_size in range(len(in_play), 6):
+            multiplier = 1
+            numerator, denominator = 1, 1
+            flat_bonus = 0
+            doubled_mask = 0
+
+            # Water synergy - adds a multiplier proportional to number of missing monsters
+            if 'W' in in_play:
+                multiplier = max((water_multiplier * (5 - hand_size)),1) # if a 5 monsters played this will make multiplier = 0, so normalise to 1
+                numerator, denominator = WATER_MULTIPLIERS[hand_size]
+
+            # Energy synergy - each energy card is doubled if not playing 5 monsters
+            if 'E' in in_play and hand_size < 5:
+                doubled_mask |= TYPE_BITS['E']
+
+            # Food synergy - if food and drink AND waste are in play, double score of all food cards
+            if 'WA' in in_play and 'F&D' in in_play:
+                doubled_mask |= TYPE_BITS['F&D']
+
+            # Nature synergy - multiplier based on the number of monsters in play
+            if 'N&B' in in_play:
+                multiplier *= bio_diversity_multiplier ** hand_size
+                numerator *= BIO_DIVERSITY_MULTIPLIERS[hand_size][0]
+                denominator *= BIO_DIVERSITY_MULTIPLIERS[hand_size][1]
+
+            # Health synergy - a flat rate for each monster in play
+            if 'HWB' in in_play:
+                flat_bonus = hand_size * well_being_multiplier
+
+            common = gcd(numerator, denominator)
+            exact_multiplier = (numerator // common, denominator // common)
+            table[(type_mask, hand_size)] = (multiplier, exact_multiplier, flat_bonus, doubled_mask, 'WA' in in_play)
+
+    return table
+
+
+SYNERGY_TABLE = build_synergy_table()
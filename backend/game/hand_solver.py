@@ -0,0 +1,53 @@
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations_with_replacement
+from .game_score_calculator import GameScoreCalculator
+
+MAX_HAND_SIZE = 5
+
+def find_best_hand(player_monsters, calculator=None):
+    # Returns (score, hand) for the best scoring hand of 1-5 monsters in a collection.
+    # A hand scores the same in any order, as waste cards are always played lowest first, and
+    # the score never drops when a card is swapped for a higher level card of the same type.
+    # So only the top 5 levels of each type can be in the best hand. That leaves at most
+    # 461 type combinations to score no matter how big the collection is.
+    calculator = calculator or GameScoreCalculator()
+
+    monsters_by_type = defaultdict(list)
+    for player_monster in player_monsters:
+        monsters_by_type[player_monster.monster.type].append(player_monster)
+
+    candidates = {
+        monster_type: heapq.nlargest(MAX_HAND_SIZE, monsters, key=lambda monster: monster.level)
+        for monster_type, monsters in monsters_by_type.items()
+    }
+    # Compact (type, level) form of the candidates so scoring skips the ORM objects
+    compact_candidates = {
+        monster_type: [(monster_type, monster.level) for monster in monsters]
+        for monster_type, monsters in candidates.items()
+    }
+
+    best_score = 0
+    best_counts = {}
+    for hand_size in range(1, MAX_HAND_SIZE + 1):
+        for type_combo in combinations_with_replacement(sorted(candidates), hand_size):
+            type_counts = Counter(type_combo)
+            # Skip combinations that need more monsters of a type than the player owns
+            if any(count > len(candidates[monster_type]) for monster_type, count in type_counts.items()):
+                continue
+
+            hand = []
+            for monster_type, count in type_counts.items():
+                hand.extend(compact_candidates[monster_type][:count])
+
+            # Candidates are distinct monsters so the hand doesn't need validating
+            score = calculator.score_hand(hand)
+            if score > best_score:
+                best_score = score
+                best_counts = type_counts
+
+    best_hand = []
+    for monster_type, count in best_counts.items():
+        best_hand.extend(candidates[monster_type][:count])
+
+    return best_score, best_hand
@@ -0,0 +1,87 @@
+from itertools import cycle, islice
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+from backend.benchmarking import format_stats, throwaway_database, time_calls, write_results
+from monsters.models import Monster, PlayerMonster
+from game.game_score_calculator import GameScoreCalculator
+from game.models import GameChallenge
+
+# Types played in each benchmarked hand, cycled to fill the hand size
+SYNERGY_HANDS = {
+    'W': ['W'],
+    'E': ['E'],
+    'F&D+WA': ['F&D', 'WA'],
+    'WA': ['WA'],
+    'N&B': ['N&B'],
+    'HWB': ['HWB'],
+    'mixed': ['W', 'E', 'F&D', 'WA', 'N&B'],
+}
+
+class Command(BaseCommand):
+    help = "Benchmarks hand scoring and the calculate-score/ and submit-attempt/ endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000, help="Calls per calculator benchmark")
+        parser.add_argument('--requests', type=int, default=300, help="Requests per endpoint benchmark")
+        parser.add_argument('--output', default='benchmark-results/scoring.json', help="Where to write the JSON results")
+        parser.add_argument('--skip-requests', action='store_true', help="Only benchmark the calculator")
+        parser.add_argument('--exact', action='store_true', help="Benchmark the calculator in exact scoring mode")
+
+    def handle(self, *args, **options):
+        results = {
+            'mode': 'exact' if options['exact'] else 'float',
+            'calculator': self.benchmark_calculator(options['iterations'], options['exact']),
+        }
+        if not options['skip_requests']:
+            results['requests'] = self.benchmark_requests(options['requests'])
+
+        write_results(options['output'], 'scoring', results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def benchmark_calculator(self, iterations, exact):
+        calculator = GameScoreCalculator(exact=exact)
+        results = {}
+        for name, types in SYNERGY_HANDS.items():
+            for hand_size in range(len(types), 6):
+                # Unsaved monsters so only the scoring itself is timed
+                hand = [
+                    PlayerMonster(id=index, level=index + 1, monster=Monster(type=monster_type))
+                    for index, monster_type in enumerate(islice(cycle(types), hand_size))
+                ]
+                stats = time_calls(lambda: calculator.calculate_score(hand), iterations)
+                results[f'{name}/{hand_size}'] = stats
+                self.stdout.write(f"calculate_score {name:>7} size {hand_size}: {format_stats(stats)}")
+        return results
+
+    def benchmark_requests(self, requests):
+        with throwaway_database():
+            user = User.objects.create_user(username='benchmark', password='benchmarkpass123')
+            monster_ids = []
+            for index, monster_type in enumerate(SYNERGY_HANDS['mixed']):
+                monster = Monster.objects.create(name=f'Bench{index}', type=monster_type, rarity='C')
+                monster_ids.append(PlayerMonster.objects.create(user=user, monster=monster, level=index + 1).id)
+            # Unbeatable so submitting never changes the levels between requests
+            challenge = GameChallenge.objects.create(name='Benchmark', target_score=10 ** 9)
+
+            client = APIClient()
+            client.force_authenticate(user=user)
+            score_body = {'monster_ids': monster_ids}
+            submit_body = {'challenge_id': challenge.id, 'monster_ids': monster_ids}
+
+            def score_uncached():
+                cache.clear()
+                client.post(reverse('calculate-hand-score'), score_body, format='json')
+
+            endpoints = {
+                'calculate-score/uncached': score_uncached,
+                'calculate-score/cached': lambda: client.post(reverse('calculate-hand-score'), score_body, format='json'),
+                'submit-attempt': lambda: client.post(reverse('submit-challenge-attempt'), submit_body, format='json'),
+            }
+            results = {}
+            for name, func in endpoints.items():
+                results[name] = time_calls(func, requests, warmup=10)
+                self.stdout.write(f"{name:>24}: {format_stats(results[name])}")
+            return results
@@ -0,0 +1,44 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from monsters.models import Monster
+from game.simulator import run_simulation, summarise_simulation
+
+class Command(BaseCommand):
+    help = "Simulates random hands from the monster catalogue and suggests challenge target scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100000, help="Hands simulated per hand size and level band")
+        parser.add_argument('--win-rate', type=float, default=0.5, help="Share of hands that should beat the suggested target")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes to spread the simulation over")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        if options['samples'] < 1:
+            raise CommandError("--samples must be at least 1")
+        if not 0 < options['win_rate'] <= 1:
+            raise CommandError("--win-rate must be between 0 and 1")
+
+        catalogue_types = list(Monster.objects.values_list('type', flat=True))
+        if not catalogue_types:
+            raise CommandError("There are no monsters in the catalogue to simulate")
+
+        histograms = run_simulation(
+            catalogue_types,
+            options['samples'],
+            workers=options['workers'],
+            seed=options['seed'],
+        )
+        summary = summarise_simulation(histograms, options['win_rate'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        for row in summary:
+            percentiles = ' '.join(f"p{percentile}={score}" for percentile, score in row['percentiles'].items())
+            self.stdout.write(
+                f"hand size {row['hand_size']} levels {row['level_band']:>5}: {percentiles} "
+                f"target={row['suggested_target_score']}"
+            )
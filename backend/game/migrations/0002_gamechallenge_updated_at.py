@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamechallenge',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
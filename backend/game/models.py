@@ -1,12 +1,30 @@
 from django.db import models
-from monsters.models import Monster
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from monsters.models import Monster, PlayerMonster
+from .score_cache import invalidate_hands, invalidate_all_hands
 
 # Create your models here.
 class GameChallenge(models.Model):
     target_score = models.IntegerField()
     name = models.CharField(max_length=20)
+    # Moves on every save, so the catalogue endpoints can tell when it last changed
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Target Score: {self.target_score}"
-    
 
+# Any saved or deleted monster can change how a cached hand scores,
+# this covers increment_level and the admin edits
+@receiver(post_save, sender=PlayerMonster)
+@receiver(post_delete, sender=PlayerMonster)
+def invalidate_cached_hands(sender, instance, **kwargs):
+    invalidate_hands(instance.user_id)
+
+# Hands score by monster type, so a changed monster can change anyone's cached hands.
+# Monsters are only edited by admins, so every save drops them all
+@receiver(post_save, sender=Monster)
+@receiver(post_delete, sender=Monster)
+def invalidate_all_cached_hands(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_all_hands()
@@ -0,0 +1,42 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from backend.cache_versions import get_version, invalidate_version
+
+# Seconds a scored hand stays cached
+HAND_CACHE_TIMEOUT = 60 * 60
+
+# Stamp shared by every user's hands, dropped when a monster's type or rarity could have changed
+MONSTERS_VERSION_KEY = 'hand-version:monsters'
+
+def get_hand_version(user_id):
+    # Stamp that changes every time one of the user's monster levels changes, so it stands in
+    # for the levels in the fingerprint
+    return get_version(f'hand-version:{user_id}')
+
+def get_hand_fingerprint(user_id, monster_ids):
+    # Order and repeats don't change how a hand scores so they don't change the key either
+    ids = ','.join(sorted({str(monster_id) for monster_id in monster_ids}))
+    digest = hashlib.sha1(ids.encode()).hexdigest()
+    # Float and exact scoring can disagree so they never share entries
+    mode = 'exact' if getattr(settings, 'GAME_EXACT_SCORING', False) else 'float'
+    versions = f'{get_version(MONSTERS_VERSION_KEY)}:{get_hand_version(user_id)}'
+    return f'hand-score:{mode}:{user_id}:{versions}:{digest}'
+
+def get_cached_hand(fingerprint):
+    # Returns {'score', 'monster_ids'} for a hand scored before, or None
+    return cache.get(fingerprint)
+
+def cache_hand(fingerprint, score, hand_ids):
+    # The fingerprint must be the one taken before the hand was loaded. Working it out again
+    # here could pick up a stamp made after a level up and file the old score under it.
+    # hand_ids are the monsters that were actually found, which submit-attempt levels up
+    cache.set(fingerprint, {'score': score, 'monster_ids': hand_ids}, HAND_CACHE_TIMEOUT)
+
+def invalidate_hands(user_id):
+    # Drops every cached hand for the user by dropping their version stamp
+    invalidate_version(f'hand-version:{user_id}')
+
+def invalidate_all_hands():
+    # Drops every user's cached hands, for when a monster itself changes
+    invalidate_version(MONSTERS_VERSION_KEY)
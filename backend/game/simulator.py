@@ -0,0 +1,100 @@
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from .game_score_calculator import GameScoreCalculator
+
+# Level ranges the simulated hands are drawn from
+LEVEL_BANDS = [(1, 10), (11, 25), (26, 50), (51, 99)]
+PERCENTILES = [10, 25, 50, 75, 90, 99]
+# Hands scored by one task, small enough that a task's hands fit comfortably in memory
+CHUNK_SIZE = 50000
+
+def simulate_chunk(task):
+    # Scores one chunk of random hands and returns a Counter of score -> number of hands.
+    # Kept at module level with plain arguments so it can run in a worker process
+    catalogue_types, hand_size, level_band, samples, seed, exact = task
+    rng = random.Random(seed)
+    low, high = level_band
+    level_span = high - low + 1
+    uniform = rng.random
+    catalogue_size = len(catalogue_types)
+    # Hands use distinct catalogue monsters unless the catalogue is smaller than the hand
+    distinct = catalogue_size >= hand_size
+
+    hands = []
+    for _ in range(samples):
+        if distinct:
+            # Rejection sampling is much quicker than rng.sample for hands this small
+            picked = set()
+            while len(picked) < hand_size:
+                picked.add(int(uniform() * catalogue_size))
+            types = [catalogue_types[index] for index in picked]
+        else:
+            types = rng.choices(catalogue_types, k=hand_size)
+        # Same as randint(low, high) but a lot cheaper per call
+        hands.append([(monster_type, low + int(uniform() * level_span)) for monster_type in types])
+
+    return Counter(GameScoreCalculator(exact=exact).calculate_scores(hands))
+
+def run_simulation(catalogue_types, samples, hand_sizes=range(1, 6), level_bands=LEVEL_BANDS, workers=1, seed=None):
+    # Simulates `samples` random hands for every hand size and level band.
+    # Returns {(hand_size, level_band): Counter of scores}
+    base_seed = seed if seed is not None else random.randrange(2 ** 32)
+    # Worked out here since worker processes may not have Django settings loaded
+    exact = GameScoreCalculator().exact
+
+    tasks = []
+    buckets = []
+    for hand_size in hand_sizes:
+        for level_band in level_bands:
+            for start in range(0, samples, CHUNK_SIZE):
+                chunk = min(CHUNK_SIZE, samples - start)
+                # Each task gets its own seed so results don't depend on the number of workers
+                tasks.append((catalogue_types, hand_size, level_band, chunk, base_seed + len(tasks), exact))
+                buckets.append((hand_size, level_band))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(simulate_chunk, tasks))
+    else:
+        results = [simulate_chunk(task) for task in tasks]
+
+    histograms = {}
+    for bucket, histogram in zip(buckets, results):
+        histograms.setdefault(bucket, Counter()).update(histogram)
+    return histograms
+
+def score_percentiles(histogram, percentiles=PERCENTILES):
+    # Nearest-rank percentiles of a score histogram
+    total = sum(histogram.values())
+    results = {}
+    seen = 0
+    wanted = sorted(percentiles)
+    for score in sorted(histogram):
+        seen += histogram[score]
+        while wanted and seen * 100 >= wanted[0] * total:
+            results[wanted.pop(0)] = score
+    return results
+
+def suggest_target_score(histogram, win_rate):
+    # Highest target score that at least `win_rate` of the simulated hands would reach
+    total = sum(histogram.values())
+    reached = 0
+    for score in sorted(histogram, reverse=True):
+        reached += histogram[score]
+        if reached >= win_rate * total:
+            return score
+    return 0
+
+def summarise_simulation(histograms, win_rate):
+    # Turns the histograms into rows that can be printed or returned by the API
+    summary = []
+    for (hand_size, (low, high)), histogram in sorted(histograms.items()):
+        summary.append({
+            'hand_size': hand_size,
+            'level_band': f'{low}-{high}',
+            'samples': sum(histogram.values()),
+            'percentiles': score_percentiles(histogram),
+            'suggested_target_score': suggest_target_score(histogram, win_rate),
+        })
+    return summary
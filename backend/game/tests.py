@@ -1,8 +1,25 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
+from django.core.management import call_command
+from itertools import combinations, combinations_with_replacement, permutations
+from collections import Counter
+from fractions import Fraction
+from io import StringIO
+from unittest.mock import patch
+import json
+import math
+import os
+import random
+import tempfile
 from monsters.models import Monster, PlayerMonster  # Import from monsters.models
-from .game_score_calculator import GameScoreCalculator
+from .game_score_calculator import GameScoreCalculator, TYPE_BITS
+from .hand_solver import find_best_hand
+from .models import GameChallenge
+from .simulator import LEVEL_BANDS, run_simulation, score_percentiles, suggest_target_score
 
 class GameScoreCalculatorTests(APITestCase):
     def setUp(self):
@@ -76,4 +93,548 @@ class GameScoreCalculatorTests(APITestCase):
         # HWB bonus = len(monsters) * 20 = 2 * 20 = 40
         # Final score = 3 + 40 = 43
         expected_score = 43
-        self.assertEqual(score, expected_score)
\ No newline at end of file
+        self.assertEqual(score, expected_score)
+
+class BestHandSolverTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='solveruser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # A mixed collection covering every synergy type, with repeated types and levels
+        collection = [
+            ('F&D', 3), ('F&D', 7), ('HWB', 1), ('HWB', 4), ('W', 2), ('W', 9),
+            ('WA', 5), ('WA', 1), ('N&B', 6), ('N&B', 2), ('E', 8), ('E', 3), ('E', 3),
+        ]
+        self.player_monsters = []
+        for index, (monster_type, level) in enumerate(collection):
+            monster = Monster.objects.create(name=f'Solver{index}', type=monster_type, rarity='C')
+            self.player_monsters.append(
+                PlayerMonster.objects.create(user=self.user, monster=monster, level=level)
+            )
+
+        self.calculator = GameScoreCalculator()
+
+    def brute_force_best_score(self):
+        best = 0
+        for hand_size in range(1, 6):
+            for hand in combinations(self.player_monsters, hand_size):
+                best = max(best, self.calculator.calculate_score(list(hand)))
+        return best
+
+    def test_solver_matches_brute_force(self):
+        score, hand = find_best_hand(self.player_monsters)
+
+        self.assertEqual(score, self.brute_force_best_score())
+        self.assertEqual(self.calculator.calculate_score(hand), score)
+
+    def test_waste_order_doesnt_change_score(self):
+        hand = [
+            PlayerMonster(id=index, level=level, monster=Monster(type=monster_type))
+            for index, (monster_type, level) in enumerate([('WA', 12), ('N&B', 10), ('HWB', 4), ('WA', 6), ('WA', 8)])
+        ]
+        scores = {self.calculator.calculate_score(list(order)) for order in permutations(hand)}
+        self.assertEqual(scores, {373})
+
+    def test_solver_matches_brute_force_on_random_collections(self):
+        # Seeded so any failure can be replayed. Several waste cards in most collections, as
+        # their order is where the solver and brute force used to disagree
+        rng = random.Random(2025)
+        types = list(TYPE_BITS)
+        for _ in range(200):
+            collection = [
+                PlayerMonster(
+                    id=index,
+                    level=rng.randint(1, 20),
+                    monster=Monster(type='WA' if index < 3 else rng.choice(types))
+                )
+                for index in range(8)
+            ]
+            best = max(
+                self.calculator.calculate_score(list(hand))
+                for hand_size in range(1, 6)
+                for hand in combinations(collection, hand_size)
+            )
+            score, hand = find_best_hand(collection)
+            self.assertEqual(score, best, [(monster.monster.type, monster.level) for monster in collection])
+            self.assertEqual(self.calculator.calculate_score(list(reversed(hand))), score)
+
+    def test_empty_collection(self):
+        self.assertEqual(find_best_hand([]), (0, []))
+
+    def test_best_hand_endpoint(self):
+        response = self.client.get(reverse('best-hand'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['score'], self.brute_force_best_score())
+        self.assertEqual(len(response.data['monsters']), len(response.data['monster_ids']))
+
+    def test_best_hand_no_monsters(self):
+        PlayerMonster.objects.filter(user=self.user).delete()
+
+        response = self.client.get(reverse('best-hand'))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BatchScoringTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='batchuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.player_monsters = []
+        for index, (monster_type, level) in enumerate([('W', 2), ('E', 3), ('WA', 4), ('F&D', 5), ('N&B', 6), ('HWB', 7)]):
+            monster = Monster.objects.create(name=f'Batch{index}', type=monster_type, rarity='C')
+            self.player_monsters.append(
+                PlayerMonster.objects.create(user=self.user, monster=monster, level=level)
+            )
+        self.other_monster = PlayerMonster.objects.create(
+            user=self.other_user, monster=self.player_monsters[0].monster, level=50
+        )
+
+        self.calculator = GameScoreCalculator()
+        self.url = reverse('calculate-hand-scores')
+
+    def test_calculate_scores_matches_calculate_score(self):
+        hands = [self.player_monsters[:n] for n in range(1, 6)] + [self.player_monsters[1:]]
+        compact_hands = [[(monster.monster.type, monster.level) for monster in hand] for hand in hands]
+
+        self.assertEqual(
+            self.calculator.calculate_scores(compact_hands),
+            [self.calculator.calculate_score(hand) for hand in hands]
+        )
+
+    def test_calculate_scores_invalid_hand_sizes(self):
+        self.assertEqual(self.calculator.calculate_scores([[], [('W', 1)] * 6]), [0, 0])
+
+    def test_batch_endpoint_matches_single_endpoint(self):
+        hands = [
+            [monster.id for monster in self.player_monsters[:3]],
+            [monster.id for monster in self.player_monsters[2:]],
+            [self.player_monsters[0].id, self.player_monsters[0].id],
+            [self.player_monsters[1].id, self.other_monster.id],
+            [],
+        ]
+
+        response = self.client.post(self.url, {'hands': hands}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        single_scores = [
+            self.client.post(reverse('calculate-hand-score'), {'monster_ids': hand}, format='json').data['score']
+            for hand in hands
+        ]
+        self.assertEqual(response.data['scores'], single_scores)
+
+    def test_waste_hands_match_in_any_order(self):
+        waste = []
+        for index, (monster_type, level) in enumerate([('WA', 12), ('N&B', 10), ('HWB', 4), ('WA', 6), ('WA', 8)]):
+            monster = Monster.objects.create(name=f'Order{index}', type=monster_type, rarity='C')
+            waste.append(PlayerMonster.objects.create(user=self.user, monster=monster, level=level).id)
+        hands = [waste, waste[:3] + [waste[4], waste[3]], list(reversed(waste))]
+
+        response = self.client.post(self.url, {'hands': hands}, format='json')
+
+        self.assertEqual(response.data['scores'], [373] * 3)
+        for hand in hands:
+            single = self.client.post(reverse('calculate-hand-score'), {'monster_ids': hand}, format='json')
+            self.assertEqual(single.data['score'], 373)
+
+    def test_batch_endpoint_single_query(self):
+        hands = [[monster.id for monster in self.player_monsters[:n]] for n in range(1, 6)]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'hands': hands}, format='json')
+
+        self.assertEqual(len(response.data['scores']), len(hands))
+
+    def test_batch_endpoint_bad_input(self):
+        response = self.client.post(self.url, {'hands': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, {'hands': [['abc']]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def reference_calculate_score(monsters, exact=False):
+    # The original list based scoring algorithm, kept to check the synergy table against.
+    # With exact=True the multipliers are Fractions and the result is floored exactly
+    bio_diversity_multiplier = Fraction(6, 5) if exact else 1.2
+    well_being_multiplier = 20
+    water_multiplier = Fraction(3, 2) if exact else 1.5
+
+    score = 0
+    multiplier = 1
+
+    monster_levels = [monster.level for monster in monsters]
+    types_in_play = [monster.monster.type for monster in monsters]
+
+    if 'W' in types_in_play:
+        multiplier = max((water_multiplier * (5 - len(monsters))),1)
+
+    if 'E' in types_in_play:
+        energy_cards = [monster for monster in monsters if monster.monster.type == 'E']
+        if len(monster_levels) < 5:
+            for energy_card in energy_cards:
+                monster_levels.remove(energy_card.level)
+                monster_levels.append(energy_card.level * 2)
+
+    if 'WA' in types_in_play and 'F&D' in types_in_play:
+        food_cards = [monster for monster in monsters if monster.monster.type == 'F&D']
+        for food_card in food_cards:
+            monster_levels.remove(food_card.level)
+            monster_levels.append(food_card.level * 2)
+
+    if 'WA' in types_in_play:
+        # Lowest level first, the order that scores best
+        waste_cards = sorted((monster for monster in monsters if monster.monster.type == 'WA'), key=lambda monster: monster.level)
+        for waste_card in waste_cards:
+            min_level = min(monster_levels)
+            monster_levels.remove(min_level)
+            monster_levels.append(waste_card.level)
+
+    if 'N&B' in types_in_play:
+        multiplier *= bio_diversity_multiplier ** len(types_in_play)
+
+    if 'HWB' in types_in_play:
+        score += len(monsters) * well_being_multiplier
+
+    for level in monster_levels:
+        score += level
+
+    return math.floor(score * multiplier) if exact else int(score * multiplier)
+
+
+class SynergyTableTests(TestCase):
+    def setUp(self):
+        self.calculator = GameScoreCalculator()
+        self.types = list(TYPE_BITS)
+
+    def random_hand(self, rng):
+        # Unsaved monsters are enough here since scoring never touches the database
+        return [
+            PlayerMonster(
+                id=index,
+                level=rng.choice([1, 2, 3, rng.randint(1, PlayerMonster.MAX_LEVEL)]),
+                monster=Monster(type=rng.choice(self.types))
+            )
+            for index in range(rng.randint(1, 5))
+        ]
+
+    def test_table_matches_reference_on_random_hands(self):
+        # Seeded so any failure can be replayed
+        rng = random.Random(2434)
+        for _ in range(20000):
+            hand = self.random_hand(rng)
+            self.assertEqual(
+                self.calculator.calculate_score(hand),
+                reference_calculate_score(hand),
+                [(monster.monster.type, monster.level) for monster in hand]
+            )
+
+    def test_table_matches_reference_on_every_type_multiset(self):
+        for hand_size in range(1, 6):
+            for type_combo in combinations_with_replacement(self.types, hand_size):
+                hand = [
+                    PlayerMonster(id=index, level=index + 1, monster=Monster(type=monster_type))
+                    for index, monster_type in enumerate(type_combo)
+                ]
+                self.assertEqual(self.calculator.calculate_score(hand), reference_calculate_score(hand))
+
+
+
+class ScoringQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='queryuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.monster_ids = []
+        for index, monster_type in enumerate(['W', 'E', 'WA', 'F&D', 'N&B']):
+            monster = Monster.objects.create(name=f'Query{index}', type=monster_type, rarity='C')
+            self.monster_ids.append(
+                PlayerMonster.objects.create(user=self.user, monster=monster, level=index + 1).id
+            )
+
+        self.challenge = GameChallenge.objects.create(name='Unbeatable', target_score=100000)
+
+    def test_calculate_score_single_query(self):
+        # Only the hand itself is loaded, whatever the hand size
+        for hand_size in range(1, 6):
+            with self.assertNumQueries(1):
+                response = self.client.post(
+                    reverse('calculate-hand-score'),
+                    {'monster_ids': self.monster_ids[:hand_size]},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_failed_attempt_queries(self):
+        # One query for the challenge and one for the hand
+        for hand_size in range(1, 6):
+            with self.assertNumQueries(2):
+                response = self.client.post(
+                    reverse('submit-challenge-attempt'),
+                    {'challenge_id': self.challenge.id, 'monster_ids': self.monster_ids[:hand_size]},
+                    format='json'
+                )
+            self.assertFalse(response.data['success'])
+
+
+class ChallengeWinTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='winner', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.player_monsters = []
+        for index, monster_type in enumerate(['HWB', 'E', 'WA', 'F&D', 'N&B']):
+            monster = Monster.objects.create(name=f'Win{index}', type=monster_type, rarity='C')
+            self.player_monsters.append(
+                PlayerMonster.objects.create(user=self.user, monster=monster, level=index + 1)
+            )
+        self.monster_ids = [monster.id for monster in self.player_monsters]
+
+        self.challenge = GameChallenge.objects.create(name='Easy', target_score=1)
+        self.url = reverse('submit-challenge-attempt')
+
+    def test_win_levels_up_and_counts_once(self):
+        response = self.client.post(
+            self.url,
+            {'challenge_id': self.challenge.id, 'monster_ids': self.monster_ids},
+            format='json'
+        )
+
+        self.assertTrue(response.data['success'])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.game_won_count, 1)
+        for index, player_monster in enumerate(self.player_monsters):
+            player_monster.refresh_from_db()
+            self.assertEqual(player_monster.level, index + 2)
+
+    def test_win_caps_at_max_level(self):
+        PlayerMonster.objects.filter(id=self.monster_ids[0]).update(level=PlayerMonster.MAX_LEVEL)
+
+        self.client.post(
+            self.url,
+            {'challenge_id': self.challenge.id, 'monster_ids': self.monster_ids[:1]},
+            format='json'
+        )
+
+        self.player_monsters[0].refresh_from_db()
+        self.assertEqual(self.player_monsters[0].level, PlayerMonster.MAX_LEVEL)
+
+    def test_win_query_count_is_constant(self):
+        # challenge, hand, savepoint, level up, locked profile, its old ranked values, win count,
+        # leaderboard trees, release savepoint
+        for hand_size in range(1, 6):
+            with self.assertNumQueries(9):
+                response = self.client.post(
+                    self.url,
+                    {'challenge_id': self.challenge.id, 'monster_ids': self.monster_ids[:hand_size]},
+                    format='json'
+                )
+            self.assertTrue(response.data['success'])
+
+
+class HandScoreCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cacheuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.player_monsters = []
+        for index, monster_type in enumerate(['HWB', 'E', 'N&B']):
+            monster = Monster.objects.create(name=f'Cache{index}', type=monster_type, rarity='C')
+            self.player_monsters.append(
+                PlayerMonster.objects.create(user=self.user, monster=monster, level=index + 1)
+            )
+        self.monster_ids = [monster.id for monster in self.player_monsters]
+        self.url = reverse('calculate-hand-score')
+
+    def score(self, monster_ids=None):
+        return self.client.post(self.url, {'monster_ids': monster_ids or self.monster_ids}, format='json').data['score']
+
+    def test_repeat_hand_is_cached(self):
+        first_score = self.score()
+
+        # Order of the ids doesn't matter
+        with self.assertNumQueries(0):
+            self.assertEqual(self.score(list(reversed(self.monster_ids))), first_score)
+
+    def test_increment_level_invalidates(self):
+        first_score = self.score()
+
+        self.player_monsters[0].increment_level(10)
+
+        with self.assertNumQueries(1):
+            self.assertGreater(self.score(), first_score)
+
+    def test_level_up_while_scoring_isnt_cached(self):
+        from . import views
+        real_get_hand = views.get_hand
+
+        def level_up_after_loading(user, monster_ids):
+            # The hand is read at the old levels and then levelled up before it's cached
+            monsters = real_get_hand(user, monster_ids)
+            self.player_monsters[0].increment_level(10)
+            return monsters
+
+        with patch.object(views, 'get_hand', level_up_after_loading):
+            first_score = self.score()
+        self.assertGreater(self.score(), first_score)
+
+    def test_monster_change_invalidates(self):
+        self.score()
+        monster = self.player_monsters[0].monster
+        monster.type = 'W'
+        monster.save()
+
+        with self.assertNumQueries(1):
+            self.score()
+
+    def test_admin_update_invalidates(self):
+        admin = User.objects.create_superuser(username='cacheadmin', password='adminpass123')
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin)
+        first_score = self.score()
+
+        admin_client.patch(
+            reverse('admin-update-player-monster', args=[self.monster_ids[1]]),
+            {'level': 50},
+            format='json'
+        )
+
+        self.assertGreater(self.score(), first_score)
+
+    def test_challenge_win_invalidates(self):
+        challenge = GameChallenge.objects.create(name='Easy', target_score=1)
+        first_score = self.score()
+
+        response = self.client.post(
+            reverse('submit-challenge-attempt'),
+            {'challenge_id': challenge.id, 'monster_ids': self.monster_ids},
+            format='json'
+        )
+
+        self.assertEqual(response.data['score'], first_score)
+        self.assertEqual(response.data['monsters_leveled'], self.monster_ids)
+        self.assertGreater(self.score(), first_score)
+
+
+class ScoreSimulatorTests(APITestCase):
+    def setUp(self):
+        for index, monster_type in enumerate(['F&D', 'HWB', 'W', 'WA', 'N&B', 'E']):
+            Monster.objects.create(name=f'Sim{index}', type=monster_type, rarity='C')
+        self.catalogue_types = list(Monster.objects.values_list('type', flat=True))
+
+        self.admin = User.objects.create_superuser(username='simadmin', password='adminpass123')
+        self.user = User.objects.create_user(username='simuser', password='testpass123')
+        self.client = APIClient()
+        self.url = reverse('admin-simulate-challenge-scores')
+
+    def test_simulation_is_seeded(self):
+        first = run_simulation(self.catalogue_types, 500, seed=7)
+        second = run_simulation(self.catalogue_types, 500, seed=7)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), 5 * len(LEVEL_BANDS))
+        self.assertTrue(all(sum(histogram.values()) == 500 for histogram in first.values()))
+
+    def test_simulated_scores_match_calculator(self):
+        # A one monster catalogue with a one level band only has one possible hand
+        histograms = run_simulation(['HWB'], 10, hand_sizes=[1], level_bands=[(5, 5)], seed=1)
+
+        self.assertEqual(histograms[(1, (5, 5))], Counter({25: 10}))
+
+    def test_percentiles_and_target(self):
+        histogram = Counter({score: 1 for score in range(1, 101)})
+
+        self.assertEqual(score_percentiles(histogram, [10, 50, 99]), {10: 10, 50: 50, 99: 99})
+        self.assertEqual(suggest_target_score(histogram, 0.25), 76)
+        self.assertEqual(suggest_target_score(histogram, 1), 1)
+
+    def test_simulate_command(self):
+        out = StringIO()
+        call_command('simulate_scores', samples=200, workers=1, seed=3, json=True, stdout=out)
+
+        summary = json.loads(out.getvalue())
+        self.assertEqual(len(summary), 5 * len(LEVEL_BANDS))
+        self.assertIn('suggested_target_score', summary[0])
+
+    def test_simulate_endpoint_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_simulate_endpoint(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(self.url, {'samples': 100, 'win_rate': 0.3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5 * len(LEVEL_BANDS))
+        self.assertEqual(response.data[0]['samples'], 100)
+
+
+class ScoringBenchmarkTests(TestCase):
+    def test_benchmark_writes_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'scoring.json')
+            call_command('benchmark_scoring', iterations=5, skip_requests=True, output=output, stdout=StringIO())
+
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        self.assertEqual(results['benchmark'], 'scoring')
+        # Every synergy at every hand size it fits in
+        self.assertEqual(len(results['results']['calculator']), 5 * 5 + 4 + 1)
+        self.assertIn('p99_us', results['results']['calculator']['F&D+WA/2'])
+
+
+class ExactScoringTests(APITestCase):
+    def setUp(self):
+        self.float_calculator = GameScoreCalculator(exact=False)
+        self.exact_calculator = GameScoreCalculator(exact=True)
+
+    def test_float_mode_is_default(self):
+        self.assertFalse(GameScoreCalculator().exact)
+
+    def test_exact_mode_removes_float_drift(self):
+        # 75 * 1.5 * 3 * 1.2 ** 2 is exactly 486 but comes out as 485.99999999999994 with floats
+        hand = [('W', 1), ('N&B', 74)]
+
+        self.assertEqual(self.float_calculator.score_hand(hand), 485)
+        self.assertEqual(self.exact_calculator.score_hand(hand), 486)
+
+    def test_exact_mode_matches_fraction_reference(self):
+        rng = random.Random(9)
+        types = list(TYPE_BITS)
+        for _ in range(5000):
+            hand = [
+                PlayerMonster(id=index, level=rng.randint(1, PlayerMonster.MAX_LEVEL), monster=Monster(type=rng.choice(types)))
+                for index in range(rng.randint(1, 5))
+            ]
+            exact_score = self.exact_calculator.calculate_score(hand)
+
+            self.assertEqual(exact_score, reference_calculate_score(hand, exact=True))
+            # Float drift can only ever round a score down
+            self.assertIn(exact_score - self.float_calculator.calculate_score(hand), (0, 1))
+
+    @override_settings(GAME_EXACT_SCORING=True)
+    def test_setting_enables_exact_mode(self):
+        user = User.objects.create_user(username='exactuser', password='testpass123')
+        self.client.force_authenticate(user=user)
+        water = Monster.objects.create(name='Water', type='W', rarity='C')
+        nature = Monster.objects.create(name='Nature', type='N&B', rarity='C')
+        monster_ids = [
+            PlayerMonster.objects.create(user=user, monster=water, level=1).id,
+            PlayerMonster.objects.create(user=user, monster=nature, level=74).id,
+        ]
+
+        response = self.client.post(reverse('calculate-hand-score'), {'monster_ids': monster_ids}, format='json')
+
+        self.assertEqual(response.data['score'], 486)
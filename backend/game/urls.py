@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path("calculate-score/", views.calculate_hand_score, name="calculate-hand-score"),
+    path("calculate-scores/", views.calculate_hand_scores, name="calculate-hand-scores"),
     path("submit-attempt/", views.submit_challenge_attempt, name="submit-challenge-attempt"),
     path("create-challenge/", views.create_challenge, name="create-challenge"),
     path("get-next-challenge/", views.get_next_challenge, name="get-next-challenge"),
+    path("best-hand/", views.get_best_hand, name="best-hand"),
 ]
\ No newline at end of file
@@ -2,33 +2,58 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import transaction
 from monsters.models import PlayerMonster
+from users.models import UserProfile
+from monsters.serializers import PlayerMonsterSerializer
 from .game_score_calculator import GameScoreCalculator
+from .hand_solver import find_best_hand
+from .score_cache import get_hand_fingerprint, get_cached_hand, cache_hand, invalidate_hands
 from .models import GameChallenge
 from .serializers import GameChallengeSerializer
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 
+# Upper limit on hands scored by one calculate-scores/ request
+MAX_BATCH_HANDS = 5000
+
+def get_hand(user, monster_ids):
+    # Loads a user's hand in one query. The monster is joined in because the calculator
+    # reads monster.type for every card, and the list stops the queryset being re-evaluated.
+    # Scores don't depend on order, but ordering by id keeps the ids sent back stable
+    return list(PlayerMonster.objects.filter(
+        id__in=monster_ids,
+        user=user
+    ).select_related('monster').order_by('id'))
+
+def score_user_hand(user, monster_ids):
+    # Returns (score, ids of the monsters found) for a hand, using the cached result when the
+    # same hand has been scored since the user's monster levels last changed
+    # Taken before the hand is loaded, so a level up that lands in between leaves this entry
+    # under a stamp that is already gone rather than the new one
+    fingerprint = get_hand_fingerprint(user.id, monster_ids)
+    cached = get_cached_hand(fingerprint)
+    if cached is not None:
+        return cached['score'], cached['monster_ids']
+
+    monsters = get_hand(user, monster_ids)
+    score = GameScoreCalculator().calculate_score(monsters)
+    hand_ids = [monster.id for monster in monsters]
+    cache_hand(fingerprint, score, hand_ids)
+    return score, hand_ids
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def calculate_hand_score(request):
 
-    try:
-        monster_ids = request.data.get('monster_ids', [])
-        monsters = PlayerMonster.objects.filter(
-            id__in=monster_ids,
-            user=request.user
-        )
-    # TODO add better error handling and codes
-    except PlayerMonster.DoesNotExist:
+    monster_ids = request.data.get('monster_ids', [])
+    if not isinstance(monster_ids, list):
         return Response({
             'error': 'Invalid monster IDs'
         }, status=status.HTTP_400_BAD_REQUEST)
-    
-    calculator = GameScoreCalculator()
-    
+
     try:
-        score = calculator.calculate_score(monsters)
+        score, _ = score_user_hand(request.user, monster_ids)
     except Exception as e:
         return Response({
             'error': f'Error in calculating score: {str(e)}'
@@ -39,6 +64,50 @@ def calculate_hand_score(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def calculate_hand_scores(request):
+    # Scores a list of hands in one request, e.g. {"hands": [[1, 2], [3, 4, 5]]}
+    hands = request.data.get('hands', [])
+    if not isinstance(hands, list) or not all(isinstance(hand, list) for hand in hands):
+        return Response({
+            'error': 'hands must be a list of monster id lists'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(hands) > MAX_BATCH_HANDS:
+        return Response({
+            'error': f'Too many hands, the maximum is {MAX_BATCH_HANDS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        hand_ids = [[int(monster_id) for monster_id in hand] for hand in hands]
+    except (TypeError, ValueError):
+        return Response({
+            'error': 'Invalid monster IDs'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # One query for every monster used in any of the hands
+    all_ids = {monster_id for hand in hand_ids for monster_id in hand}
+    cards = {
+        monster_id: (monster_type, level)
+        for monster_id, monster_type, level in PlayerMonster.objects.filter(
+            id__in=all_ids,
+            user=request.user
+        ).values_list('id', 'monster__type', 'level')
+    }
+
+    # Same rules as calculate-score/, unknown ids are dropped and repeated ids only count once.
+    # Hands score the same in any order, so the order ids are sent in doesn't matter
+    compact_hands = [
+        [cards[monster_id] for monster_id in dict.fromkeys(hand) if monster_id in cards]
+        for hand in hand_ids
+    ]
+    scores = GameScoreCalculator().calculate_scores(compact_hands)
+
+    return Response({
+        'scores': scores
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def submit_challenge_attempt(request):
@@ -48,28 +117,30 @@ def submit_challenge_attempt(request):
         challenge_data = GameChallengeSerializer(challenge).data
 
         monster_ids = request.data.get('monster_ids', [])
-        monsters = PlayerMonster.objects.filter(
-            id__in=monster_ids,
-            user=request.user
-        )
-
-        calculator = GameScoreCalculator()
-        score = calculator.calculate_score(monsters)
+        score, hand_ids = score_user_hand(request.user, monster_ids)
         # When winning, level up the monsters and increment user's games won
         if score >= challenge.target_score:
-            for monster in monsters:
-                monster.level += 1
-                monster.save()
-                user_profile = request.user.profile
-                user_profile.game_won_count += 1
-                user_profile.save()
+            # One transaction so the level ups and the win count are saved together
+            with transaction.atomic():
+                PlayerMonster.objects.filter(
+                    id__in=hand_ids,
+                    user=request.user
+                ).level_up()
+                # The leaderboard reads these, so they change in the same transaction as the win.
+                # Locked and saved rather than updated so the leaderboard trees move with them
+                profile = UserProfile.objects.select_for_update().get(user=request.user)
+                profile.game_won_count += 1
+                profile.best_challenge_score = max(profile.best_challenge_score, score)
+                profile.save(update_fields=['game_won_count', 'best_challenge_score', 'updated_at'])
+                # Bulk updates don't send post_save so the cached hands are dropped here
+                invalidate_hands(request.user.id)
 
             return Response({
                 'success': True,
                 'score': score,
                 'challenge': challenge_data,
                 'message': 'Challenge completed! Monsters leveled up.',
-                'monsters_leveled': [monster.id for monster in monsters]
+                'monsters_leveled': hand_ids
             }, status=status.HTTP_200_OK)
         else:
             return Response({
@@ -106,3 +177,18 @@ def get_next_challenge(request):
         return Response(serializer.data, status=status.HTTP_200_OK)
     else:
         return Response({'error': 'No challenge found'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_best_hand(request):
+    # Finds the highest scoring hand from the user's whole collection
+    player_monsters = PlayerMonster.objects.filter(user=request.user).select_related('monster')
+    score, hand = find_best_hand(player_monsters)
+    if not hand:
+        return Response({'error': 'No monsters found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        'score': score,
+        'monster_ids': [monster.id for monster in hand],
+        'monsters': PlayerMonsterSerializer(hand, many=True).data
+    }, status=status.HTTP_200_OK)
@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .spatial_index import location_index, IndexedLocation
+from .tiles import invalidate_tiles
 
 # Create your models here.
 class Location(models.Model):
@@ -22,7 +26,57 @@ class Location(models.Model):
 
     # Will auto set current date and time everytime model is saved
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for the delta sync, which reads everything changed since a cursor
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Position as loaded, so a save knows which tiles the location is leaving
+        if 'latitude' in field_names and 'longitude' in field_names:
+            instance._saved_position = (instance.latitude, instance.longitude)
+        return instance
 
     def __str__(self):
         return self.location_name
+
+class DeletedLocation(models.Model):
+    # Tombstone left by a deleted location so delta sync clients know to drop their copy
+    location_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Deleted location {self.location_id}"
+
+@receiver(pre_save, sender=Location)
+def remember_saved_position(sender, instance, **kwargs):
+    # Locations loaded from the database already know where they were, this covers ones that weren't
+    if instance.id is not None and not hasattr(instance, '_saved_position'):
+        instance._saved_position = Location.objects.filter(id=instance.id).values_list('latitude', 'longitude').first()
+
+# Keeps the nearby search index and the cached map tiles in step with every saved or deleted location
+@receiver(post_save, sender=Location)
+def update_location_index(sender, instance, **kwargs):
+    positions = [(instance.latitude, instance.longitude)]
+    previous = getattr(instance, '_saved_position', None)
+    if previous is not None:
+        positions.append(previous)
+    instance._saved_position = (instance.latitude, instance.longitude)
+    # Only once committed, so a rolled back save never reaches the index
+    indexed = IndexedLocation(instance.latitude, instance.longitude, instance.distance_threshold, instance.type)
+    location_id = instance.id
+    transaction.on_commit(lambda: location_index.apply_committed(location_id, indexed))
+    # After the index update, as commit callbacks run in order and a tile rebuilt in between
+    # would come from the old index
+    invalidate_tiles(*positions)
+
+@receiver(post_delete, sender=Location)
+def remove_from_location_index(sender, instance, **kwargs):
+    location_id = instance.id
+    transaction.on_commit(lambda: location_index.apply_committed(location_id, None))
+    # After the index update, see update_location_index
+    invalidate_tiles((instance.latitude, instance.longitude))
+
+@receiver(post_delete, sender=Location)
+def record_deleted_location(sender, instance, **kwargs):
+    DeletedLocation.objects.create(location_id=instance.id)
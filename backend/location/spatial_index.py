@@ -0,0 +1,156 @@
+import math
+import random
+import threading
+from collections import defaultdict, namedtuple
+from django.core.cache import cache
+
+EARTH_RADIUS_M = 6371e3
+# Metres in one degree of latitude, also used to turn distance_threshold (degrees) into metres
+METRES_PER_DEGREE = 111320
+# Grid cell size in degrees, about 1.1km north to south
+CELL_SIZE = 0.01
+INDEX_VERSION_KEY = 'location-index-version'
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    # Great circle distance in metres between two points given in degrees
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+# What the index keeps for each location, enough to check collection without a query
+IndexedLocation = namedtuple('IndexedLocation', ['latitude', 'longitude', 'distance_threshold', 'type'])
+
+def get_cell(latitude, longitude):
+    return (math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE))
+
+def get_index_version():
+    # A counter that every committed location change moves on by one, so a process can tell
+    # whether its own change was the only one since it loaded. It starts somewhere random so a
+    # stamp that gets evicted can't come back matching an old index
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, random.getrandbits(48), None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+class LocationIndex:
+    # In-process grid over latitude/longitude so nearby searches only look at a few cells.
+    # It loads from the database on first use and after another process changes a location,
+    # which it can tell from the version stamp when the cache is shared between processes.
+    # Changes made by this process are applied to the grid once they commit, rather than
+    # rebuilding it.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.cells = defaultdict(dict)  # cell -> {location_id: (latitude, longitude)}
+            self.locations = {}  # location_id -> IndexedLocation
+            self.version = None
+
+    def ensure_current(self):
+        # Read before the rows, so a change committed while loading makes the next read load again
+        version = get_index_version()
+        with self.lock:
+            if version is not None and version == self.version:
+                return
+            # Imported here as the models module imports this one for its signals
+            from .models import Location
+            rows = Location.objects.values_list('id', 'latitude', 'longitude', 'distance_threshold', 'type')
+            self.cells = defaultdict(dict)
+            self.locations = {}
+            for location_id, *fields in rows:
+                self._add(location_id, IndexedLocation(*fields))
+            self.version = version
+
+    def _add(self, location_id, location):
+        self.locations[location_id] = location
+        self.cells[get_cell(location.latitude, location.longitude)][location_id] = (location.latitude, location.longitude)
+
+    def _remove(self, location_id):
+        location = self.locations.pop(location_id, None)
+        if location is None:
+            return
+        cell = get_cell(location.latitude, location.longitude)
+        self.cells[cell].pop(location_id, None)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def apply_committed(self, location_id, location):
+        # Called once a save (location is the new IndexedLocation) or delete (location is None)
+        # has committed. Moves the stamp on so other processes sharing the cache reload, and applies
+        # the change here if no other change came in since this process last loaded
+        try:
+            version = cache.incr(INDEX_VERSION_KEY)
+        except ValueError:
+            # The stamp was evicted, so every process sharing the cache loads again anyway
+            return
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self._remove(location_id)
+                if location is not None:
+                    self._add(location_id, location)
+                self.version = version
+
+    def get(self, location_id):
+        # Returns the IndexedLocation for an id, or None
+        self.ensure_current()
+        with self.lock:
+            return self.locations.get(location_id)
+
+    def within_bounds(self, south, west, north, east):
+        # Returns [(location_id, latitude, longitude)] for every location inside the box
+        self.ensure_current()
+        min_row, min_column = get_cell(south, west)
+        max_row, max_column = get_cell(north, east)
+
+        with self.lock:
+            # Large boxes cover more cells than are occupied, so scan the occupied ones instead
+            if (max_row - min_row + 1) * (max_column - min_column + 1) > len(self.cells):
+                cells = [
+                    locations for (row, column), locations in self.cells.items()
+                    if min_row <= row <= max_row and min_column <= column <= max_column
+                ]
+            else:
+                cells = [
+                    self.cells[(row, column)]
+                    for row in range(min_row, max_row + 1)
+                    for column in range(min_column, max_column + 1)
+                    if (row, column) in self.cells
+                ]
+
+            return [
+                (location_id, latitude, longitude)
+                for locations in cells
+                for location_id, (latitude, longitude) in locations.items()
+                if south <= latitude <= north and west <= longitude <= east
+            ]
+
+    def nearby(self, latitude, longitude, radius_m, limit=None):
+        # Returns [(distance in metres, location_id)] within radius_m, nearest first
+        latitude_delta = radius_m / METRES_PER_DEGREE
+        # Degrees of longitude shrink towards the poles, so the box is wider there
+        longitude_delta = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+
+        candidates = self.within_bounds(
+            max(latitude - latitude_delta, -90),
+            max(longitude - longitude_delta, -180),
+            min(latitude + latitude_delta, 90),
+            min(longitude + longitude_delta, 180),
+        )
+        matches = []
+        for location_id, location_latitude, location_longitude in candidates:
+            distance = haversine_m(latitude, longitude, location_latitude, location_longitude)
+            if distance <= radius_m:
+                matches.append((distance, location_id))
+
+        matches.sort()
+        return matches[:limit] if limit else matches
+
+# Shared by every request in this process
+location_index = LocationIndex()
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from django.db.models import Q
+from .models import Location, DeletedLocation
+from .serializers import LocationSerializer
+
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 1000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# A cursor is the last (time, id) sent from the saved locations and from the tombstones. They are
+# paged separately, as a location id is only ever in one of them: a deleted location no longer
+# has a row and ids are never reused. The id breaks ties between rows saved in the same microsecond
+START_CURSOR = (EPOCH, 0, EPOCH, 0)
+
+def to_microseconds(moment):
+    return (moment - EPOCH) // ONE_MICROSECOND
+
+def from_microseconds(microseconds):
+    return EPOCH + timedelta(microseconds=microseconds)
+
+def encode_cursor(cursor):
+    updated_at, location_id, deleted_at, tombstone_id = cursor
+    return f'{to_microseconds(updated_at)}.{location_id}.{to_microseconds(deleted_at)}.{tombstone_id}'
+
+def decode_cursor(token):
+    # Raises ValueError for anything that isn't a cursor this module made
+    updated_at, location_id, deleted_at, tombstone_id = (int(part) for part in token.split('.'))
+    return from_microseconds(updated_at), location_id, from_microseconds(deleted_at), tombstone_id
+
+def cursor_from_time(since):
+    # Everything saved or deleted after since, for clients starting from their own timestamp
+    return since, 2 ** 63 - 1, since, 2 ** 63 - 1
+
+def after(queryset, field, moment, row_id):
+    # Rows after (moment, row_id) in (field, id) order, which the index on field serves
+    return queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': row_id})).order_by(field, 'id')
+
+def get_changes(cursor, limit):
+    # Returns {'updated', 'deleted', 'cursor', 'has_more'} for everything after the cursor
+    updated_at, location_id, deleted_at, tombstone_id = cursor
+
+    locations = list(after(Location.objects.all(), 'updated_at', updated_at, location_id)[:limit + 1])
+    tombstones = list(
+        after(DeletedLocation.objects.all(), 'deleted_at', deleted_at, tombstone_id)
+        .values_list('id', 'location_id', 'deleted_at')[:limit + 1]
+    )
+    has_more = len(locations) > limit or len(tombstones) > limit
+    locations = locations[:limit]
+    tombstones = tombstones[:limit]
+
+    if locations:
+        updated_at, location_id = locations[-1].updated_at, locations[-1].id
+    if tombstones:
+        tombstone_id, _, deleted_at = tombstones[-1]
+
+    return {
+        'updated': LocationSerializer(locations, many=True).data,
+        'deleted': [deleted_location_id for _, deleted_location_id, _ in tombstones],
+        'cursor': encode_cursor((updated_at, location_id, deleted_at, tombstone_id)),
+        'has_more': has_more,
+    }
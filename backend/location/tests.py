@@ -3,7 +3,13 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Location
+from .models import Location, DeletedLocation
+from .spatial_index import location_index, haversine_m, INDEX_VERSION_KEY
+from .tiles import tile_position, tile_bounds
+from django.core.cache import cache
+from django.db import transaction
+from monsters.models import Monster, PlayerMonster
+from monsters.catalogue import monster_catalogue
 import json
 
 class LocationModelTests(TestCase): 
@@ -57,6 +63,22 @@ class LocationAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
     
+    #testing polling the locations with an ETag gets a 304 until a location changes
+    def test_get_all_locations_conditional(self):
+        response = self.client.get(self.get_all_locations_url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.get_all_locations_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.location.delete()
+        response = self.client.get(self.get_all_locations_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data, [])
+
     #testing creating a valid location
     def test_create_location_success(self):
         data = {
@@ -171,4 +193,309 @@ class LocationSerializerTests(TestCase):
         }
         
         response = self.client.post(self.create_location_url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class NearbyLocationTests(TestCase):
+    def setUp(self):
+        # The index lives for the whole process, so start each test from the test database
+        location_index.reset()
+
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Roughly 0m, 110m, 1.1km and 55km north of the search point
+        self.forum = Location.objects.create(location_name="Forum", latitude=50.7350, longitude=-3.5330, type="W")
+        self.library = Location.objects.create(location_name="Library", latitude=50.7360, longitude=-3.5330, type="E")
+        self.station = Location.objects.create(location_name="Station", latitude=50.7450, longitude=-3.5330, type="F&D")
+        self.far_away = Location.objects.create(location_name="Far Away", latitude=51.2300, longitude=-3.5330, type="N&B")
+
+        self.nearby_url = reverse('nearby_locations')
+
+    def get_names(self, response):
+        return [location['location_name'] for location in response.data]
+
+    def test_nearby_sorted_by_distance(self):
+        response = self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533, 'radius': 2000})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_names(response), ["Forum", "Library", "Station"])
+        self.assertAlmostEqual(response.data[1]['distance'], 111.2, delta=1)
+
+    def test_nearby_limit(self):
+        response = self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533, 'radius': 2000, 'limit': 1})
+        self.assertEqual(self.get_names(response), ["Forum"])
+
+    def test_index_follows_create_and_update(self):
+        # Load the index first so the changes below go through the incremental path
+        self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533})
+
+        # The index only takes changes once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('create_location'),
+                {"location_name": "Cafe", "latitude": 50.7351, "longitude": -3.5330, "type": "F&D"},
+                format='json'
+            )
+            self.client.patch(
+                reverse('update_location', args=[self.forum.id]),
+                {"latitude": 51.2301, "longitude": -3.5330},
+                format='json'
+            )
+            self.library.delete()
+
+        response = self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533, 'radius': 500})
+        self.assertEqual(self.get_names(response), ["Cafe"])
+
+        response = self.client.get(self.nearby_url, {'lat': 51.23, 'lon': -3.533, 'radius': 500})
+        self.assertEqual(self.get_names(response), ["Far Away", "Forum"])
+
+    def test_rolled_back_changes_skip_index(self):
+        self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533})
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Location.objects.create(location_name="Phantom", latitude=50.7351, longitude=-3.5330, type="W")
+            self.forum.delete()
+            raise RuntimeError
+
+        response = self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533, 'radius': 500})
+        self.assertEqual(self.get_names(response), ["Forum", "Library"])
+
+    def test_other_process_changes_reload(self):
+        self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533})
+        # Another process moving the stamp on, as its own commit would
+        Location.objects.filter(id=self.library.id).update(latitude=51.2301)
+        cache.incr(INDEX_VERSION_KEY)
+
+        response = self.client.get(self.nearby_url, {'lat': 50.735, 'lon': -3.533, 'radius': 500})
+        self.assertEqual(self.get_names(response), ["Forum"])
+
+    def test_haversine(self):
+        # One degree of latitude is about 111.2km
+        self.assertAlmostEqual(haversine_m(50, -3, 51, -3), 111195, delta=10)
+
+    def test_invalid_parameters(self):
+        for params in [{}, {'lat': 'abc', 'lon': 0}, {'lat': 95, 'lon': 0}, {'lat': 0, 'lon': 0, 'radius': 10 ** 7}]:
+            response = self.client.get(self.nearby_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CollectAtLocationTests(TestCase):
+    def setUp(self):
+        location_index.reset()
+
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        for rarity in ['C', 'R', 'E', 'L']:
+            Monster.objects.create(name=f"Water{rarity}", type="W", rarity=rarity)
+        # The default threshold of 0.001 degrees is about 111m
+        self.fountain = Location.objects.create(location_name="Fountain", latitude=50.7350, longitude=-3.5330, type="W")
+        self.bins = Location.objects.create(location_name="Bins", latitude=50.7350, longitude=-3.5300, type="WA")
+
+        self.collect_url = reverse('collect_at_location')
+
+    def test_collect_within_threshold(self):
+        # About 55m north of the fountain
+        response = self.client.post(
+            self.collect_url,
+            {'location_id': self.fountain.id, 'latitude': 50.7355, 'longitude': -3.5330},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertAlmostEqual(response.data['distance'], 55.6, delta=1)
+        self.assertEqual(response.data['player_monster']['monster']['type'], 'W')
+        self.assertEqual(PlayerMonster.objects.filter(user=self.user).count(), 1)
+
+    def test_collect_too_far(self):
+        # About 222m north, twice the threshold
+        response = self.client.post(
+            self.collect_url,
+            {'location_id': self.fountain.id, 'latitude': 50.7370, 'longitude': -3.5330},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertAlmostEqual(response.data['max_distance'], 111.3, delta=0.1)
+        self.assertFalse(PlayerMonster.objects.filter(user=self.user).exists())
+
+    def test_collect_uses_index(self):
+        location_index.ensure_current()
+        monster_catalogue.ensure_current()
+        # Only the spawn itself touches the database, never the location table
+        with self.assertNumQueries(1):
+            self.client.post(
+                self.collect_url,
+                {'location_id': self.fountain.id, 'latitude': 50.7350, 'longitude': -3.5330},
+                format='json'
+            )
+
+    def test_collect_no_monsters_for_type(self):
+        response = self.client.post(
+            self.collect_url,
+            {'location_id': self.bins.id, 'latitude': 50.7350, 'longitude': -3.5300},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_collect_invalid_requests(self):
+        response = self.client.post(self.collect_url, {'location_id': 999999, 'latitude': 0, 'longitude': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        for data in [{}, {'location_id': self.fountain.id, 'latitude': 'abc', 'longitude': 0},
+                     {'location_id': self.fountain.id, 'latitude': 95, 'longitude': 0}]:
+            response = self.client.post(self.collect_url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class LocationTileTests(TestCase):
+    def setUp(self):
+        location_index.reset()
+        cache.clear()
+
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.forum = Location.objects.create(location_name="Forum", latitude=50.7350, longitude=-3.5330, type="W")
+        self.library = Location.objects.create(location_name="Library", latitude=50.7360, longitude=-3.5330, type="E")
+        self.far_away = Location.objects.create(location_name="Far Away", latitude=51.5000, longitude=-0.1200, type="N&B")
+
+    def get_tile_url(self, latitude, longitude, z):
+        x, y = tile_position(latitude, longitude, z)
+        return reverse('location_tile', args=[z, int(x), int(y)])
+
+    def get_names(self, response):
+        return [location['location_name'] for location in response.data['locations']]
+
+    def test_tile_bounds_contain_point(self):
+        x, y = tile_position(50.735, -3.533, 16)
+        south, west, north, east = tile_bounds(16, int(x), int(y))
+        self.assertTrue(south <= 50.735 <= north and west <= -3.533 <= east)
+
+    def test_zoomed_in_tile_returns_locations(self):
+        response = self.client.get(self.get_tile_url(50.735, -3.533, 16))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['clustered'])
+        self.assertEqual(self.get_names(response), ["Forum", "Library"])
+
+    def test_zoomed_out_tile_returns_clusters(self):
+        response = self.client.get(reverse('location_tile', args=[0, 0, 0]))
+
+        self.assertTrue(response.data['clustered'])
+        self.assertEqual(sum(cluster['count'] for cluster in response.data['clusters']), 3)
+        # Exeter and London are far enough apart to land in different cells even at zoom 5
+        response = self.client.get(self.get_tile_url(50.735, -3.533, 5))
+        self.assertEqual(sorted(cluster['count'] for cluster in response.data['clusters']), [1, 2])
+
+    def test_tile_cached_until_location_saved(self):
+        url = self.get_tile_url(50.735, -3.533, 16)
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        # Moving the forum to London drops both its old and its new tiles
+        london_url = self.get_tile_url(51.5, -0.12, 16)
+        self.client.get(london_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('update_location', args=[self.forum.id]),
+                {"latitude": 51.5001, "longitude": -0.1200},
+                format='json'
+            )
+        self.assertEqual(self.get_names(self.client.get(url)), ["Library"])
+        self.assertEqual(self.get_names(self.client.get(london_url)), ["Forum", "Far Away"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.library.delete()
+        self.assertEqual(self.get_names(self.client.get(url)), [])
+
+    def test_save_finds_old_tile_without_index(self):
+        url = self.get_tile_url(50.735, -3.533, 16)
+        self.client.get(url)
+        location_index.reset()
+
+        forum = Location.objects.get(id=self.forum.id)
+        forum.latitude = 51.5001
+        forum.longitude = -0.12
+        # The old position comes from when the row was loaded, not the index
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            forum.save()
+        self.assertEqual(self.get_names(self.client.get(url)), ["Library"])
+
+    def test_index_updated_before_tiles_dropped(self):
+        url = self.get_tile_url(50.735, -3.533, 16)
+        self.client.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.forum.latitude = 51.5001
+            self.forum.longitude = -0.12
+            self.forum.save()
+
+        # A request between the commit callbacks must not cache the tile from the old index
+        for callback in callbacks:
+            callback()
+            self.client.get(url)
+        self.assertEqual(self.get_names(self.client.get(url)), ["Library"])
+
+    def test_invalid_tile(self):
+        for args in [[21, 0, 0], [2, 4, 0], [2, 0, 4]]:
+            response = self.client.get(reverse('location_tile', args=args))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class LocationChangesTests(TestCase):
+    def setUp(self):
+        location_index.reset()
+
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.locations = [
+            Location.objects.create(location_name=f"Spot {index}", latitude=50.7, longitude=-3.5, type="W")
+            for index in range(5)
+        ]
+        self.changes_url = reverse('location_changes')
+
+    def get_names(self, response):
+        return [location['location_name'] for location in response.data['updated']]
+
+    def test_first_sync_pages_through_everything(self):
+        response = self.client.get(self.changes_url, {'limit': 3})
+        self.assertEqual(self.get_names(response), ["Spot 0", "Spot 1", "Spot 2"])
+        self.assertTrue(response.data['has_more'])
+
+        response = self.client.get(self.changes_url, {'limit': 3, 'cursor': response.data['cursor']})
+        self.assertEqual(self.get_names(response), ["Spot 3", "Spot 4"])
+        self.assertFalse(response.data['has_more'])
+
+    def test_only_changes_after_cursor(self):
+        cursor = self.client.get(self.changes_url).data['cursor']
+
+        self.locations[1].location_name = "Renamed"
+        self.locations[1].save()
+        deleted_id = self.locations[3].id
+        self.locations[3].delete()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.changes_url, {'cursor': cursor})
+        self.assertEqual(self.get_names(response), ["Renamed"])
+        self.assertEqual(response.data['deleted'], [deleted_id])
+
+        # Nothing new after the latest cursor
+        response = self.client.get(self.changes_url, {'cursor': response.data['cursor']})
+        self.assertEqual((response.data['updated'], response.data['deleted']), ([], []))
+
+    def test_since_timestamp(self):
+        since = Location.objects.get(id=self.locations[2].id).updated_at
+        response = self.client.get(self.changes_url, {'since': since.isoformat()})
+        self.assertEqual(self.get_names(response), ["Spot 3", "Spot 4"])
+
+    def test_tombstone_recorded(self):
+        location_id = self.locations[0].id
+        self.locations[0].delete()
+        self.assertTrue(DeletedLocation.objects.filter(location_id=location_id).exists())
+
+    def test_invalid_parameters(self):
+        for params in [{'since': 'yesterday'}, {'cursor': 'abc'}, {'cursor': '1.2'}, {'limit': 0}]:
+            response = self.client.get(self.changes_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
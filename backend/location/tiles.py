@@ -0,0 +1,96 @@
+import math
+from django.core.cache import cache
+from django.db import transaction
+from .spatial_index import location_index
+
+# Zoom levels served, the same range as the usual web map tile servers
+MAX_TILE_ZOOM = 20
+# Below this zoom a tile returns clusters with counts instead of every location
+CLUSTER_ZOOM = 14
+# Each clustered tile is split into this many cells across and down
+CLUSTER_GRID = 8
+# Web mercator can't show the poles, so latitudes are clamped to this
+MAX_MERCATOR_LATITUDE = 85.0511287798
+# Seconds a built tile stays cached
+TILE_CACHE_TIMEOUT = 60 * 60
+
+def tile_position(latitude, longitude, z):
+    # Fractional tile x and y of a point at zoom z, so int() of each is the tile it's in
+    tiles = 2 ** z
+    latitude = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, latitude))
+    phi = math.radians(latitude)
+    x = (longitude + 180) / 360 * tiles
+    y = (1 - math.log(math.tan(phi) + 1 / math.cos(phi)) / math.pi) / 2 * tiles
+    # The east edge and the clamped south edge belong to the last tile rather than one past it
+    return min(x, tiles - 1e-9), min(max(y, 0), tiles - 1e-9)
+
+def tile_bounds(z, x, y):
+    # Returns (south, west, north, east) of a tile in degrees
+    tiles = 2 ** z
+
+    def latitude_at(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / tiles))))
+
+    # The top and bottom rows also hold the locations beyond the mercator limit
+    north = 90 if y == 0 else latitude_at(y)
+    south = -90 if y == tiles - 1 else latitude_at(y + 1)
+    return south, x / tiles * 360 - 180, north, (x + 1) / tiles * 360 - 180
+
+def get_tile_key(z, x, y):
+    return f'location-tile:{z}:{x}:{y}'
+
+def get_tile_keys_for_point(latitude, longitude):
+    # Cache keys of the tile holding the point at every zoom
+    keys = []
+    for z in range(MAX_TILE_ZOOM + 1):
+        x, y = tile_position(latitude, longitude, z)
+        keys.append(get_tile_key(z, int(x), int(y)))
+    return keys
+
+def build_tile(z, x, y):
+    # Returns {'clustered': bool, 'clusters' or 'locations'} for the locations in a tile
+    points = []
+    for location_id, latitude, longitude in location_index.within_bounds(*tile_bounds(z, x, y)):
+        tile_x, tile_y = tile_position(latitude, longitude, z)
+        # Points on a shared edge only belong to one tile, the same one invalidation drops
+        if int(tile_x) == x and int(tile_y) == y:
+            points.append((location_id, latitude, longitude, tile_x - x, tile_y - y))
+
+    if z >= CLUSTER_ZOOM:
+        # Imported here as the models module imports this one for its signals
+        from .models import Location
+        from .serializers import LocationSerializer
+        locations = Location.objects.filter(id__in=[point[0] for point in points]).order_by('id')
+        return {'clustered': False, 'locations': LocationSerializer(locations, many=True).data}
+
+    cells = {}
+    for location_id, latitude, longitude, offset_x, offset_y in points:
+        cell = (int(offset_x * CLUSTER_GRID), int(offset_y * CLUSTER_GRID))
+        total = cells.setdefault(cell, [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += latitude
+        total[2] += longitude
+
+    clusters = [
+        {'latitude': latitude / count, 'longitude': longitude / count, 'count': count}
+        for (count, latitude, longitude) in (cells[cell] for cell in sorted(cells))
+    ]
+    return {'clustered': True, 'clusters': clusters}
+
+def get_tile(z, x, y):
+    key = get_tile_key(z, x, y)
+    tile = cache.get(key)
+    if tile is None:
+        tile = build_tile(z, x, y)
+        cache.set(key, tile, TILE_CACHE_TIMEOUT)
+    return tile
+
+def invalidate_tiles(*positions):
+    # Drops the cached tiles holding each (latitude, longitude) at every zoom. Like the hand cache
+    # they are dropped again after commit, so a tile built mid-transaction can't stay cached
+    keys = set()
+    for latitude, longitude in positions:
+        keys.update(get_tile_keys_for_point(latitude, longitude))
+    keys = list(keys)
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
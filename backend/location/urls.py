@@ -5,4 +5,8 @@ urlpatterns = [
     path('locations/', views.get_all_locations, name='get_all_locations'),
     path('locations/create/', views.create_location, name='create_location'),
     path('locations/update/<int:location_id>/', views.update_location, name='update_location'),
+    path('nearby/', views.get_nearby_locations, name='nearby_locations'),
+    path('tiles/<int:z>/<int:x>/<int:y>/', views.get_location_tile, name='location_tile'),
+    path('changes/', views.get_location_changes, name='location_changes'),
+    path('collect/', views.collect_at_location, name='collect_at_location'),
 ]
\ No newline at end of file
@@ -1,10 +1,22 @@
 from django.shortcuts import render,get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import LocationSerializer
 from .models import Location
+from .spatial_index import location_index, haversine_m, METRES_PER_DEGREE
+from .tiles import get_tile, MAX_TILE_ZOOM
+from backend.conditional import conditional_list_response
+from .sync import get_changes, decode_cursor, cursor_from_time, START_CURSOR, DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT
+from monsters.serializers import PlayerMonsterSerializer
+from monsters.spawner import spawn_random_monster
+
+# Limits for the nearby search so a single request can't pull the whole table
+MAX_NEARBY_RADIUS_M = 50000
+MAX_NEARBY_RESULTS = 200
 
 # Create your views here.
 @api_view(['POST'])
@@ -44,12 +56,166 @@ def update_location(request, location_id):
 # returns all locations in the db
 def get_all_locations(request):
     try:
-        locations = Location.objects.all()
-        serializer = LocationSerializer(locations, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Pollers get a 304 until a location is saved or deleted
+        return conditional_list_response(request, Location.objects.all(), LocationSerializer)
         
     except Exception as e:
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+# returns the locations within radius metres of a point, nearest first
+def get_nearby_locations(request):
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        radius = float(request.GET.get('radius', 1000))
+        limit = int(request.GET.get('limit', 50))
+    except (KeyError, ValueError):
+        return Response(
+            {"error": "lat and lon are required, and lat, lon, radius and limit must be numbers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return Response({"error": "lat or lon out of range"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < radius <= MAX_NEARBY_RADIUS_M or not 0 < limit <= MAX_NEARBY_RESULTS:
+        return Response(
+            {"error": f"radius must be between 0 and {MAX_NEARBY_RADIUS_M}m and limit between 1 and {MAX_NEARBY_RESULTS}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        matches = location_index.nearby(latitude, longitude, radius, limit)
+        locations = Location.objects.in_bulk([location_id for _, location_id in matches])
+
+        results = []
+        for distance, location_id in matches:
+            # Skips anything deleted since the index was last updated
+            if location_id in locations:
+                data = LocationSerializer(locations[location_id]).data
+                data['distance'] = round(distance, 1)
+                results.append(data)
+        return Response(results, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+# returns the locations saved and deleted since a cursor, so clients can keep a local copy up to date
+def get_location_changes(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SYNC_LIMIT))
+        if 'cursor' in request.GET:
+            cursor = decode_cursor(request.GET['cursor'])
+        elif 'since' in request.GET:
+            since = parse_datetime(request.GET['since'])
+            if since is None:
+                raise ValueError
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            cursor = cursor_from_time(since)
+        else:
+            # No cursor means a first sync, which gets every location
+            cursor = START_CURSOR
+    except (ValueError, OverflowError):
+        return Response(
+            {"error": "since must be an ISO 8601 time, cursor one returned by this endpoint and limit a number"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not 0 < limit <= MAX_SYNC_LIMIT:
+        return Response({"error": f"limit must be between 1 and {MAX_SYNC_LIMIT}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response(get_changes(cursor, limit), status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+# returns the locations in one web map tile, or clusters of them when zoomed out
+def get_location_tile(request, z, x, y):
+    if z > MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return Response(
+            {"error": f"Tile {z}/{x}/{y} does not exist, zoom goes up to {MAX_TILE_ZOOM}"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        tile = get_tile(z, x, y)
+        return Response({'z': z, 'x': x, 'y': y, **tile}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+# Gives the user a monster from a location, but only if their reported position is close enough
+def collect_at_location(request):
+    try:
+        location_id = int(request.data['location_id'])
+        latitude = float(request.data['latitude'])
+        longitude = float(request.data['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {"error": "location_id, latitude and longitude are required and must be numbers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return Response({"error": "latitude or longitude out of range"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Read from the index so the check itself needs no query
+        location = location_index.get(location_id)
+        if location is None:
+            return Response({"error": "Location not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        distance = haversine_m(latitude, longitude, location.latitude, location.longitude)
+        # distance_threshold is stored in degrees
+        max_distance = location.distance_threshold * METRES_PER_DEGREE
+        if distance > max_distance:
+            return Response(
+                {
+                    "error": "Too far away from this location",
+                    "distance": round(distance, 1),
+                    "max_distance": round(max_distance, 1),
+                },
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        player_monster = spawn_random_monster(request.user, location.type)
+        if player_monster is None:
+            return Response(
+                {"error": f"No monsters of type {location.type}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(
+            {
+                "distance": round(distance, 1),
+                "player_monster": PlayerMonsterSerializer(player_monster).data,
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
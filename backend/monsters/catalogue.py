@@ -0,0 +1,108 @@
+import random
+import threading
+from collections import defaultdict
+from backend.cache_versions import get_version, invalidate_version
+
+CATALOGUE_VERSION_KEY = 'monster-catalogue-version'
+
+class AliasSampler:
+    # Walker's alias method: after setting up in O(n), each draw is one random column and one
+    # coin flip, however many outcomes there are
+
+    def __init__(self, outcomes, weights):
+        if not outcomes or len(outcomes) != len(weights) or min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError("Need at least one outcome and non-negative weights with a positive total")
+        self.outcomes = list(outcomes)
+        count = len(self.outcomes)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+
+        small = [index for index, weight in enumerate(scaled) if weight < 1]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            low = small.pop()
+            high = large.pop()
+            self.probabilities[low] = scaled[low]
+            self.aliases[low] = high
+            scaled[high] -= 1 - scaled[low]
+            (small if scaled[high] < 1 else large).append(high)
+        # Anything left over is 1 up to rounding error, so it keeps its own column
+
+    def sample(self, rng=random):
+        column = rng.randrange(len(self.outcomes))
+        if rng.random() < self.probabilities[column]:
+            return self.outcomes[column]
+        return self.outcomes[self.aliases[column]]
+
+class MonsterCatalogue:
+    # The Monster table grouped by (type, rarity), with rarity samplers per type built on demand
+    # for each drop table. Each process loads it once and keeps it until its version stamp
+    # changes, which it does whenever a monster is saved or deleted
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.buckets = {}
+        self.samplers = {}
+
+    def ensure_current(self):
+        version = get_version(CATALOGUE_VERSION_KEY)
+        if version == self.version:
+            return
+
+        # Imported here as the models module imports this one for its signals
+        from .models import Monster
+        buckets = defaultdict(list)
+        for monster in Monster.objects.order_by('id'):
+            buckets[(monster.type, monster.rarity)].append(monster)
+
+        with self.lock:
+            self.buckets = dict(buckets)
+            self.samplers = {}
+            self.version = version
+
+    def get_sampler(self, monster_type, weights):
+        # Sampler over the rarities the type has monsters of. Rarities it has none of are left
+        # out and the rest are scaled up to fill their share. None if the type has no monsters
+        key = (monster_type, tuple(sorted(weights.items())))
+        if key not in self.samplers:
+            rarities = [
+                rarity for rarity, weight in weights.items()
+                if weight > 0 and (monster_type, rarity) in self.buckets
+            ]
+            self.samplers[key] = AliasSampler(rarities, [weights[rarity] for rarity in rarities]) if rarities else None
+        return self.samplers[key]
+
+    def pick(self, monster_type, weights, rng=random, checked=False):
+        # Returns a random Monster of the type with its rarity drawn from weights, or None if there
+        # are none. Shared between requests, so callers must not change it. Callers drawing many
+        # at once can call ensure_current() first and pass checked=True to skip the version check
+        if not checked:
+            self.ensure_current()
+        with self.lock:
+            sampler = self.get_sampler(monster_type, weights)
+            if sampler is None:
+                return None
+            return rng.choice(self.buckets[(monster_type, sampler.sample(rng))])
+
+    def pick_rarity(self, monster_type, rarity, rng=random, checked=False):
+        # Returns a random Monster of the type and rarity, or None if there are none
+        if not checked:
+            self.ensure_current()
+        with self.lock:
+            monsters = self.buckets.get((monster_type, rarity))
+            return rng.choice(monsters) if monsters else None
+
+    def bucket_sizes(self):
+        # Returns {(type, rarity): number of monsters} for the whole catalogue
+        self.ensure_current()
+        with self.lock:
+            return {bucket: len(monsters) for bucket, monsters in self.buckets.items()}
+
+def invalidate_catalogue():
+    invalidate_version(CATALOGUE_VERSION_KEY)
+
+# Shared by every request in this process
+monster_catalogue = MonsterCatalogue()
@@ -0,0 +1,47 @@
+import random
+from django.conf import settings
+from .catalogue import monster_catalogue
+
+# Rarities from most to least common, pity for a rarity is also reset by anything rarer
+RARITY_ORDER = ['C', 'R', 'E', 'L']
+
+def get_drop_table(monster_type, event=None):
+    # Returns (table name, table) for a spawn or pull, or raises KeyError for an unknown event
+    tables = settings.MONSTER_DROP_TABLES
+    if event is not None:
+        name = f'event:{event}'
+        return name, tables[name]
+    name = f'type:{monster_type}'
+    if name in tables:
+        return name, tables[name]
+    return 'default', tables['default']
+
+def resolve_pulls(monster_type, table, counters, count, rng=random):
+    # Draws count monsters of the type from the drop table entirely in memory. counters holds
+    # {rarity: pulls since that rarity or rarer last dropped} for the table's pity rarities and
+    # is updated in place. Returns [(Monster, whether pity forced it)], or None if the type has
+    # no monsters
+    pity = table.get('pity', {})
+    # One version check for the whole batch rather than a cache read per pull
+    monster_catalogue.ensure_current()
+    results = []
+    for _ in range(count):
+        monster = None
+        # The rarest rarity whose pity is reached this pull is guaranteed. Rarities the type has
+        # no monsters of can't be forced, their counters just keep running
+        for rarity in reversed(RARITY_ORDER):
+            if rarity in pity and counters.get(rarity, 0) + 1 >= pity[rarity]:
+                monster = monster_catalogue.pick_rarity(monster_type, rarity, rng, checked=True)
+                if monster is not None:
+                    break
+        forced = monster is not None
+        if monster is None:
+            monster = monster_catalogue.pick(monster_type, table['weights'], rng, checked=True)
+            if monster is None:
+                return None
+
+        rank = RARITY_ORDER.index(monster.rarity)
+        for rarity in pity:
+            counters[rarity] = 0 if RARITY_ORDER.index(rarity) <= rank else counters.get(rarity, 0) + 1
+        results.append((monster, forced))
+    return results
@@ -0,0 +1,92 @@
+from django.db.models import Q
+from .models import Monster, PlayerMonster
+from .serializers import PlayerMonsterSerializer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# ordering= value -> (field, descending). Ties are always broken by id in the same direction,
+# so (field, id) is a unique position the cursor can start after
+ORDERINGS = {
+    'id': ('id', False),
+    '-id': ('id', True),
+    'level': ('level', False),
+    '-level': ('level', True),
+}
+FIELDS = ['id', 'user', 'monster', 'level']
+MONSTER_TYPES = dict(Monster.TYPES)
+RARITIES = dict(Monster.RARITY_CHOICES)
+
+def parse_listing_params(params):
+    # Reads the collection query parameters, raising ValueError with a message for the client
+    options = {'paginate': 'page_size' in params or 'cursor' in params}
+
+    options['type'] = params.get('type')
+    if options['type'] is not None and options['type'] not in MONSTER_TYPES:
+        raise ValueError(f"type must be one of {', '.join(MONSTER_TYPES)}")
+    options['rarity'] = params.get('rarity')
+    if options['rarity'] is not None and options['rarity'] not in RARITIES:
+        raise ValueError(f"rarity must be one of {', '.join(RARITIES)}")
+
+    try:
+        options['min_level'] = int(params['min_level']) if 'min_level' in params else None
+        options['page_size'] = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("min_level and page_size must be numbers")
+    if not 0 < options['page_size'] <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+
+    options['ordering'] = params.get('ordering', 'id')
+    if options['ordering'] not in ORDERINGS:
+        raise ValueError(f"ordering must be one of {', '.join(ORDERINGS)}")
+
+    options['fields'] = None
+    if params.get('fields'):
+        options['fields'] = params['fields'].split(',')
+        if not set(options['fields']) <= set(FIELDS):
+            raise ValueError(f"fields can only include {', '.join(FIELDS)}")
+
+    options['cursor'] = None
+    if params.get('cursor'):
+        try:
+            # The cursor is the ordering field and id of the last row of the previous page
+            value, last_id = (int(part) for part in params['cursor'].split('.'))
+        except ValueError:
+            raise ValueError("cursor must be one returned by a previous page")
+        options['cursor'] = (value, last_id)
+    return options
+
+def list_player_monsters(user, options):
+    # Returns (rows, next cursor) for the user's collection as one query, joined to Monster only
+    # when a filter or the monster field needs it. The next cursor is None on the last page
+    player_monsters = PlayerMonster.objects.filter(user=user)
+    if options['fields'] is None or 'monster' in options['fields']:
+        player_monsters = player_monsters.select_related('monster')
+    if options['type'] is not None:
+        player_monsters = player_monsters.filter(monster__type=options['type'])
+    if options['rarity'] is not None:
+        player_monsters = player_monsters.filter(monster__rarity=options['rarity'])
+    if options['min_level'] is not None:
+        player_monsters = player_monsters.filter(level__gte=options['min_level'])
+
+    field, descending = ORDERINGS[options['ordering']]
+    direction = '-' if descending else ''
+    player_monsters = player_monsters.order_by(f'{direction}{field}', f'{direction}id')
+
+    if options['cursor'] is not None:
+        value, last_id = options['cursor']
+        after = 'lt' if descending else 'gt'
+        player_monsters = player_monsters.filter(
+            Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'id__{after}': last_id})
+        )
+
+    if not options['paginate']:
+        return list(player_monsters), None
+
+    rows = list(player_monsters[:options['page_size'] + 1])
+    if len(rows) <= options['page_size']:
+        return rows, None
+    last = rows[options['page_size'] - 1]
+    return rows[:options['page_size']], f"{getattr(last, field)}.{last.id}"
+
+def serialize_player_monsters(rows, options):
+    return PlayerMonsterSerializer(rows, many=True, fields=options['fields']).data
@@ -0,0 +1,59 @@
+import random
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+from backend.benchmarking import format_stats, throwaway_database, time_calls, write_results
+from monsters.catalogue import invalidate_catalogue, monster_catalogue
+from monsters.drops import get_drop_table, resolve_pulls
+from monsters.models import Monster
+
+# Monsters per (type, rarity) in the seeded catalogue
+MONSTERS_PER_BUCKET = 25
+
+class Command(BaseCommand):
+    help = "Benchmarks drawing from the drop tables and the pull/ and random-monster/ endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint benchmark")
+        parser.add_argument('--draws', type=int, default=10000, help="Pulls resolved per in-memory benchmark call")
+        parser.add_argument('--output', default='benchmark-results/pulls.json', help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            results = self.benchmark_pulls(options['requests'], options['draws'])
+
+        write_results(options['output'], 'pulls', results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def benchmark_pulls(self, requests, draws):
+        user = User.objects.create_user(username='benchmark', password='benchmarkpass123')
+        Monster.objects.bulk_create([
+            Monster(name=f'{monster_type}{rarity}{index}', type=monster_type, rarity=rarity)
+            for monster_type, _ in Monster.TYPES
+            for rarity, _ in Monster.RARITY_CHOICES
+            for index in range(MONSTERS_PER_BUCKET)
+        ])
+        # bulk_create sends no signals, so the catalogue is told about the new monsters here
+        invalidate_catalogue()
+        monster_catalogue.ensure_current()
+
+        _, table = get_drop_table('HWB')
+        rng = random.Random(0)
+        counters = {}
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        benchmarks = {
+            f'resolve_pulls/{draws}': (lambda: resolve_pulls('HWB', table, counters, draws, rng), max(1, requests // 50)),
+            'random-monster': (lambda: client.post(reverse('random-monster'), {'type': 'HWB'}, format='json'), requests),
+            'pull/1': (lambda: client.post(reverse('pull-monsters'), {'type': 'HWB', 'count': 1}, format='json'), requests),
+            'pull/10': (lambda: client.post(reverse('pull-monsters'), {'type': 'HWB', 'count': 10}, format='json'), requests),
+        }
+        results = {}
+        for name, (func, iterations) in benchmarks.items():
+            results[name] = time_calls(func, iterations, warmup=5)
+            self.stdout.write(f"{name:>20}: {format_stats(results[name])}")
+        results['drop_tables'] = settings.MONSTER_DROP_TABLES
+        return results
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monsters', '0002_alter_monster_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monster',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:56
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+MAX_LEVEL = 99
+
+
+def merge_duplicate_player_monsters(apps, schema_editor):
+    # Racing grants could give a user the same monster twice. Each extra row stands for a grant
+    # that should have been a level up, so the levels are added together on the oldest row
+    PlayerMonster = apps.get_model('monsters', 'PlayerMonster')
+    duplicates = (
+        PlayerMonster.objects.values('user_id', 'monster_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'), total_level=Sum('level'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = PlayerMonster.objects.filter(user_id=duplicate['user_id'], monster_id=duplicate['monster_id'])
+        rows.exclude(id=duplicate['keep_id']).delete()
+        rows.filter(id=duplicate['keep_id']).update(level=min(duplicate['total_level'], MAX_LEVEL))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monsters', '0003_monster_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_player_monsters, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='playermonster',
+            constraint=models.UniqueConstraint(fields=('user', 'monster'), name='unique_player_monster'),
+        ),
+    ]
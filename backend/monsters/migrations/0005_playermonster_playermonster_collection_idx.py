@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monsters', '0004_playermonster_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playermonster',
+            index=models.Index(fields=['user', 'monster', 'level'], name='playermonster_collection_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.19 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('monsters', '0005_playermonster_playermonster_collection_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50)),
+                ('counters', models.JSONField(default=dict)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pity_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pitycounter',
+            constraint=models.UniqueConstraint(fields=('user', 'table'), name='unique_pity_counter'),
+        ),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from django.db import models, connections
+from django.db.models import F
+from django.db.models.functions import Least
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from users.models import User
+from .catalogue import invalidate_catalogue
 
 # Create your models here.
 class Monster(models.Model):
@@ -23,16 +28,85 @@ class Monster(models.Model):
     name = models.CharField(max_length=20)
     type = models.CharField(max_length=3, choices=TYPES)
     rarity = models.CharField(max_length=1, choices=RARITY_CHOICES)
+    # Moves on every save, so the catalogue endpoints can tell when it last changed
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} (Rarity: {self.rarity}, Type:{self.type})"
     
+class PlayerMonsterQuerySet(models.QuerySet):
+    def level_up(self, amount=1):
+        # Levels up every monster in the queryset with one UPDATE, capped at MAX_LEVEL.
+        # The new level is worked out by the database so concurrent level ups aren't lost
+        return self.update(level=Least(F('level') + amount, self.model.MAX_LEVEL))
+
+    def grant(self, user, monster, level=1, increment_existing=True):
+        # Gives the user the monster at level in one INSERT ... ON CONFLICT statement. If they
+        # already have it, it's levelled up by level (capped at MAX_LEVEL), or with
+        # increment_existing=False left alone and None returned. Concurrent grants can't make
+        # duplicates, the unique (user, monster) constraint turns them into level ups.
+        # Like update() this sends no save signals
+        return self.grant_many(user, [(monster, level)], increment_existing)[0]
+
+    def grant_many(self, user, grants, increment_existing=True):
+        # grant() for a list of (monster, level) in one statement, returning the PlayerMonsters
+        # (or None) in the same order. Repeats of a monster are added together first, as one
+        # statement can't touch a row twice on every database
+        levels = {}
+        monsters = {}
+        for monster, level in grants:
+            levels[monster.pk] = levels.get(monster.pk, 0) + level
+            monsters[monster.pk] = monster
+        if not levels:
+            return []
+
+        table = self.model._meta.db_table
+        if increment_existing:
+            conflict = (
+                f"DO UPDATE SET level = CASE WHEN {table}.level + excluded.level > %s THEN %s "
+                f"ELSE {table}.level + excluded.level END"
+            )
+            conflict_params = [self.model.MAX_LEVEL, self.model.MAX_LEVEL]
+        else:
+            conflict = "DO NOTHING"
+            conflict_params = []
+
+        values = ", ".join(["(%s, %s, %s)"] * len(levels))
+        params = [value for monster_id, level in levels.items() for value in (user.pk, monster_id, level)]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, monster_id, level) VALUES {values} "
+                f"ON CONFLICT (user_id, monster_id) {conflict} RETURNING id, monster_id, level",
+                [*params, *conflict_params]
+            )
+            rows = cursor.fetchall()
+
+        granted = {}
+        for row_id, monster_id, level in rows:
+            player_monster = self.model.from_db(self.db, ['id', 'user_id', 'monster_id', 'level'], [row_id, user.pk, monster_id, level])
+            player_monster.user = user
+            player_monster.monster = monsters[monster_id]
+            granted[monster_id] = player_monster
+        return [granted.get(monster.pk) for monster, _ in grants]
+
 class PlayerMonster(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='player_monsters') # includes details from the user
     monster = models.ForeignKey(Monster, on_delete=models.CASCADE, related_name='player_monsters') # includes details from the monster
     level = models.IntegerField(default=1)
     MAX_LEVEL = 99
 
+    objects = PlayerMonsterQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # A user has each monster once, getting it again levels it up instead
+            models.UniqueConstraint(fields=['user', 'monster'], name='unique_player_monster'),
+        ]
+        indexes = [
+            # Covers listing and filtering a collection by level without reading the rows
+            models.Index(fields=['user', 'monster', 'level'], name='playermonster_collection_idx'),
+        ]
+
     def increment_level(self, amount):
         new_level = min(self.level + amount, self.MAX_LEVEL)
         self.level = new_level
@@ -41,3 +115,22 @@ class PlayerMonster(models.Model):
     def __str__(self):
         return f"{self.user.username}'s {self.monster.name} (Level: {self.level})"
 
+class PityCounter(models.Model):
+    # Pulls since each rarity with pity last dropped, per user and drop table
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pity_counters')
+    table = models.CharField(max_length=50)
+    counters = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'table'], name='unique_pity_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}'s pity for {self.table}: {self.counters}"
+
+# Covers create_monster, the admin and anything else that changes the catalogue
+@receiver(post_save, sender=Monster)
+@receiver(post_delete, sender=Monster)
+def invalidate_monster_catalogue(sender, instance, **kwargs):
+    invalidate_catalogue()
@@ -11,4 +11,11 @@ class PlayerMonsterSerializer(serializers.ModelSerializer):
     monster = MonsterSerializer(read_only=True)
     class Meta:
         model = PlayerMonster
-        fields = ['id', 'user', 'monster', 'level']
\ No newline at end of file
+        fields = ['id', 'user', 'monster', 'level']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields limits the output to those names, for clients that only need some of them
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
\ No newline at end of file
@@ -0,0 +1,19 @@
+from game.score_cache import invalidate_hands
+from .catalogue import monster_catalogue
+from .drops import get_drop_table
+from .models import PlayerMonster
+
+def spawn_random_monster(user, monster_type):
+    # Gives the user a random monster of the type, picked by rarity from its drop table. If they
+    # already have it it levels up instead. Returns the PlayerMonster, or None if the type has no
+    # monsters. The monster comes from the in-memory catalogue and the grant is one upsert, so
+    # this is a single round trip. Pity only counts pulls, keeping spawns off the counter rows
+    _, table = get_drop_table(monster_type)
+    selected_monster = monster_catalogue.pick(monster_type, table['weights'])
+    if selected_monster is None:
+        return None
+
+    player_monster = PlayerMonster.objects.grant(user, selected_monster)
+    # The upsert skips the save signals that would drop the user's cached hands
+    invalidate_hands(user.id)
+    return player_monster
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from django.db.models import Count, Sum
+from .catalogue import monster_catalogue
+from .models import PlayerMonster
+
+def percentage(part, whole):
+    return round(100 * part / whole, 1) if whole else 0.0
+
+def get_collection_summary(user):
+    # Counts, levels and completion for a user's collection. The collection side is one grouped
+    # query over (type, rarity) buckets and the catalogue side comes from the in-memory catalogue
+    owned = (
+        PlayerMonster.objects.filter(user=user)
+        .values_list('monster__type', 'monster__rarity')
+        .annotate(count=Count('id'), total_level=Sum('level'))
+        .order_by()
+    )
+    catalogue = monster_catalogue.bucket_sizes()
+
+    by_type = defaultdict(lambda: {'count': 0, 'catalogue': 0})
+    by_rarity = defaultdict(lambda: {'count': 0, 'catalogue': 0})
+    for (monster_type, rarity), size in catalogue.items():
+        by_type[monster_type]['catalogue'] += size
+        by_rarity[rarity]['catalogue'] += size
+
+    total_monsters = 0
+    total_level = 0
+    for monster_type, rarity, count, bucket_level in owned:
+        by_type[monster_type]['count'] += count
+        by_rarity[rarity]['count'] += count
+        total_monsters += count
+        total_level += bucket_level
+
+    # Each monster can only be owned once, so owned rows over catalogue size is completion
+    for group in [*by_type.values(), *by_rarity.values()]:
+        group['completion'] = percentage(group['count'], group['catalogue'])
+
+    catalogue_size = sum(catalogue.values())
+    return {
+        'total_monsters': total_monsters,
+        'total_level': total_level,
+        'average_level': round(total_level / total_monsters, 2) if total_monsters else 0,
+        'catalogue_size': catalogue_size,
+        'completion': percentage(total_monsters, catalogue_size),
+        'by_type': dict(sorted(by_type.items())),
+        'by_rarity': dict(sorted(by_rarity.items())),
+    }
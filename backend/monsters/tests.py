@@ -5,7 +5,13 @@ from unittest.mock import patch
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Monster, PlayerMonster
+from django.test import override_settings
+from .models import Monster, PlayerMonster, PityCounter
+from .catalogue import AliasSampler, monster_catalogue
+from .drops import get_drop_table, resolve_pulls
+from collections import Counter
+from django.db import IntegrityError, transaction
+import random
 
 # Create your tests here.
 class GenerateRandomMonsterTests(TestCase):
@@ -41,6 +47,301 @@ class GenerateRandomMonsterTests(TestCase):
         response = self.client.post(self.url, {'type': 'INVALID'})
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+class MonsterCatalogueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cataloguser', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/monsters/random-monster/'
+
+    def test_alias_sampler_matches_weights(self):
+        sampler = AliasSampler(['C', 'R', 'E', 'L'], [0.6, 0.25, 0.1, 0.05])
+        rng = random.Random(1)
+        counts = Counter(sampler.sample(rng) for _ in range(100000))
+        for rarity, weight in zip(['C', 'R', 'E', 'L'], [0.6, 0.25, 0.1, 0.05]):
+            self.assertAlmostEqual(counts[rarity] / 100000, weight, delta=0.01)
+
+    def test_missing_rarities_and_shared_buckets(self):
+        # Two commons and no rare, epic or legendary monsters used to make the view error
+        first = Monster.objects.create(name='WaterOne', type='W', rarity='C')
+        second = Monster.objects.create(name='WaterTwo', type='W', rarity='C')
+
+        weights = {'C': 0.6, 'R': 0.25, 'E': 0.1, 'L': 0.05}
+        picked = {monster_catalogue.pick('W', weights, random.Random(seed)).id for seed in range(20)}
+        self.assertEqual(picked, {first.id, second.id})
+
+        response = self.client.post(self.url, {'type': 'W'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_spawn_is_one_query(self):
+        Monster.objects.create(name='WaterOne', type='W', rarity='C')
+        monster_catalogue.ensure_current()
+        with self.assertNumQueries(1):
+            self.client.post(self.url, {'type': 'W'})
+        # Levelling up an owned monster is the same upsert
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'type': 'W'})
+        self.assertEqual(response.data['level'], 2)
+
+    def test_new_monsters_join_catalogue(self):
+        self.assertIsNone(monster_catalogue.pick_rarity('E', 'L'))
+        self.client.post('/api/monsters/create-monster/', {'name': 'Sparky', 'type': 'E', 'rarity': 'L'})
+        self.assertEqual(monster_catalogue.pick_rarity('E', 'L').name, 'Sparky')
+
+class GrantTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='grantuser', password='testpass')
+        self.monster = Monster.objects.create(name='Splash', type='W', rarity='C')
+
+    def test_grant_creates_then_levels_up(self):
+        first = PlayerMonster.objects.grant(self.user, self.monster)
+        second = PlayerMonster.objects.grant(self.user, self.monster, level=3)
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual((first.level, second.level), (1, 4))
+        self.assertEqual(PlayerMonster.objects.get(id=first.id).level, 4)
+
+    def test_grant_capped_at_max_level(self):
+        PlayerMonster.objects.create(user=self.user, monster=self.monster, level=PlayerMonster.MAX_LEVEL - 1)
+        self.assertEqual(PlayerMonster.objects.grant(self.user, self.monster, level=5).level, PlayerMonster.MAX_LEVEL)
+
+    def test_grant_without_increment(self):
+        self.assertEqual(PlayerMonster.objects.grant(self.user, self.monster, level=7, increment_existing=False).level, 7)
+        self.assertIsNone(PlayerMonster.objects.grant(self.user, self.monster, increment_existing=False))
+        self.assertEqual(PlayerMonster.objects.get(user=self.user).level, 7)
+
+    def test_grant_many_in_order(self):
+        other = Monster.objects.create(name='Drip', type='W', rarity='R')
+        PlayerMonster.objects.grant(self.user, other, level=2)
+        granted = PlayerMonster.objects.grant_many(self.user, [(other, 1), (self.monster, 1), (other, 1)])
+
+        self.assertEqual([player_monster.monster for player_monster in granted], [other, self.monster, other])
+        self.assertEqual([player_monster.level for player_monster in granted], [4, 1, 4])
+        self.assertEqual(PlayerMonster.objects.filter(user=self.user).count(), 2)
+
+    def test_duplicates_rejected(self):
+        PlayerMonster.objects.create(user=self.user, monster=self.monster)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PlayerMonster.objects.create(user=self.user, monster=self.monster)
+
+    def test_admin_add_existing_monster(self):
+        admin = User.objects.create_superuser(username='grantadmin', password='adminpass123')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = f'/api/user/admin/users/{self.user.id}/add-monster/'
+
+        response = client.post(url, {'monster_id': self.monster.id, 'level': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['level'], 5)
+
+        response = client.post(url, {'monster_id': self.monster.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+DROP_TABLES = {
+    'default': {'weights': {'C': 0.6, 'R': 0.25, 'E': 0.1, 'L': 0.05}, 'pity': {'E': 20, 'L': 90}},
+    'type:W': {'weights': {'C': 1, 'R': 1}},
+    'event:storm': {'weights': {'E': 1, 'L': 1}, 'pity': {'L': 3}},
+}
+
+@override_settings(MONSTER_DROP_TABLES=DROP_TABLES)
+class DropTableTests(TestCase):
+    def setUp(self):
+        self.monsters = {
+            rarity: Monster.objects.create(name=f'Health{rarity}', type='HWB', rarity=rarity)
+            for rarity in ['C', 'R', 'E', 'L']
+        }
+        self.table = DROP_TABLES['default']
+
+    def test_table_selection(self):
+        self.assertEqual(get_drop_table('HWB')[0], 'default')
+        self.assertEqual(get_drop_table('W')[0], 'type:W')
+        self.assertEqual(get_drop_table('W', 'storm')[0], 'event:storm')
+        with self.assertRaises(KeyError):
+            get_drop_table('W', 'unknown')
+
+    def test_drops_match_weights_without_pity(self):
+        table = {'weights': self.table['weights']}
+        pulls = resolve_pulls('HWB', table, {}, 100000, random.Random(2))
+        counts = Counter(monster.rarity for monster, _ in pulls)
+        for rarity, weight in table['weights'].items():
+            self.assertAlmostEqual(counts[rarity] / 100000, weight, delta=0.01)
+
+    def test_pity_bounds_dry_runs(self):
+        counters = {}
+        pulls = resolve_pulls('HWB', self.table, counters, 20000, random.Random(3))
+        for rarity, threshold in self.table['pity'].items():
+            rank = ['C', 'R', 'E', 'L'].index(rarity)
+            gap = longest = 0
+            for monster, _ in pulls:
+                gap = 0 if ['C', 'R', 'E', 'L'].index(monster.rarity) >= rank else gap + 1
+                longest = max(longest, gap)
+            # Pity drops on the threshold'th pull, so at most threshold - 1 pulls go without
+            self.assertLess(longest, threshold)
+        self.assertTrue(any(forced for _, forced in pulls))
+        self.assertTrue(all(counters[rarity] < threshold for rarity, threshold in self.table['pity'].items()))
+
+    def test_pity_skips_missing_rarities(self):
+        # Only commons, so the epic and legendary counters just keep counting
+        Monster.objects.create(name='WasteC', type='WA', rarity='C')
+        counters = {}
+        pulls = resolve_pulls('WA', self.table, counters, 100, random.Random(4))
+        self.assertEqual({monster.rarity for monster, _ in pulls}, {'C'})
+        self.assertEqual(counters, {'E': 100, 'L': 100})
+        self.assertIsNone(resolve_pulls('N&B', self.table, {}, 1))
+
+@override_settings(MONSTER_DROP_TABLES=DROP_TABLES)
+class PullMonstersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='puller', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for rarity in ['C', 'R', 'E', 'L']:
+            Monster.objects.create(name=f'Health{rarity}', type='HWB', rarity=rarity)
+        self.url = '/api/monsters/pull/'
+
+    def test_multi_pull_granted_together(self):
+        monster_catalogue.ensure_current()
+        self.client.post(self.url, {'type': 'HWB'}, format='json')
+        # Savepoints, the locked counter, one upsert and the counter update
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, {'type': 'HWB', 'count': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['pulls']), 10)
+
+        levels = sum(PlayerMonster.objects.filter(user=self.user).values_list('level', flat=True))
+        self.assertEqual(levels, 11)
+        self.assertEqual(response.data['table'], 'default')
+        self.assertEqual(PityCounter.objects.get(user=self.user, table='default').counters, response.data['pity_counters'])
+
+    def test_event_pity_persists(self):
+        # Pity at 3 means the third pull of a dry run is a guaranteed legendary
+        for _ in range(3):
+            response = self.client.post(self.url, {'type': 'HWB', 'event': 'storm'}, format='json')
+            if response.data['pulls'][0]['monster']['rarity'] == 'L':
+                break
+        else:
+            self.fail("No legendary within the pity threshold")
+        self.assertEqual(PityCounter.objects.get(user=self.user, table='event:storm').counters, {'L': 0})
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post(self.url, {'type': 'HWB', 'count': 11}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'type': 'HWB', 'count': 'x'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'type': 'HWB', 'event': 'unknown'}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(self.url, {'type': 'INVALID'}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(PityCounter.objects.exists())
+
+class CreatePlayerMonsterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='creator', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.monster = Monster.objects.create(name='Splash', type='W', rarity='C')
+        self.url = '/api/monsters/create-player-monster/'
+
+    def test_same_monster_twice_levels_up(self):
+        first = self.client.post(self.url, {'monster_id': self.monster.id}, format='json')
+        second = self.client.post(self.url, {'monster_id': self.monster.id}, format='json')
+
+        self.assertEqual((first.status_code, second.status_code), (status.HTTP_201_CREATED, status.HTTP_201_CREATED))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(second.data['level'], 2)
+        self.assertEqual(PlayerMonster.objects.filter(user=self.user).count(), 1)
+
+    def test_unknown_monster(self):
+        response = self.client.post(self.url, {'monster_id': 999999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class PlayerMonsterListingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='collector', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/monsters/get-player-monsters/'
+
+        # (type, rarity, level), with ties on level to check paging doesn't skip or repeat any
+        for index, (monster_type, rarity, level) in enumerate([
+            ('W', 'C', 5), ('W', 'R', 12), ('E', 'C', 5), ('E', 'L', 30), ('WA', 'E', 12), ('N&B', 'C', 1),
+        ]):
+            monster = Monster.objects.create(name=f'Monster{index}', type=monster_type, rarity=rarity)
+            PlayerMonster.objects.create(user=self.user, monster=monster, level=level)
+
+    def test_plain_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]['monster']['name'], 'Monster0')
+
+    def test_filters(self):
+        response = self.client.get(self.url, {'type': 'W'})
+        self.assertEqual([row['monster']['name'] for row in response.data], ['Monster0', 'Monster1'])
+
+        response = self.client.get(self.url, {'rarity': 'C', 'min_level': 5})
+        self.assertEqual([row['monster']['name'] for row in response.data], ['Monster0', 'Monster2'])
+
+    def test_cursor_pages_by_level(self):
+        levels = []
+        params = {'ordering': '-level', 'page_size': 2}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertLessEqual(len(response.data['results']), 2)
+            levels += [(row['level'], row['id']) for row in response.data['results']]
+            if response.data['next_cursor'] is None:
+                break
+            params['cursor'] = response.data['next_cursor']
+
+        self.assertEqual(len(levels), 6)
+        self.assertEqual(levels, sorted(levels, reverse=True))
+
+    def test_fields_projection(self):
+        response = self.client.get(self.url, {'fields': 'id,level', 'page_size': 1})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'level'})
+
+    def test_invalid_parameters(self):
+        for params in [{'type': 'XYZ'}, {'rarity': 'Z'}, {'min_level': 'high'}, {'page_size': 0},
+                       {'ordering': 'name'}, {'fields': 'id,secret'}, {'cursor': 'abc'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_profile_uses_same_listing(self):
+        response = self.client.get('/api/user/profile/collector/', {'page_size': 4, 'fields': 'level'})
+        self.assertEqual(len(response.data['monsters']), 4)
+        self.assertIsNotNone(response.data['monsters_next_cursor'])
+
+class CollectionSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='summaryuser', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        monsters = [
+            Monster.objects.create(name=f'Monster{index}', type=monster_type, rarity=rarity)
+            for index, (monster_type, rarity) in enumerate([('W', 'C'), ('W', 'R'), ('E', 'C'), ('E', 'L')])
+        ]
+        PlayerMonster.objects.create(user=self.user, monster=monsters[0], level=4)
+        PlayerMonster.objects.create(user=self.user, monster=monsters[3], level=9)
+        # Someone else's monsters don't count
+        other = User.objects.create_user(username='otheruser', password='testpass')
+        PlayerMonster.objects.create(user=other, monster=monsters[1], level=50)
+
+    def test_summary(self):
+        monster_catalogue.ensure_current()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/monsters/collection-summary/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_monsters'], 2)
+        self.assertEqual(response.data['average_level'], 6.5)
+        self.assertEqual(response.data['completion'], 50.0)
+        self.assertEqual(response.data['by_type']['W'], {'count': 1, 'catalogue': 2, 'completion': 50.0})
+        self.assertEqual(response.data['by_rarity']['R'], {'count': 0, 'catalogue': 1, 'completion': 0.0})
+        self.assertEqual(response.data['by_rarity']['L']['count'], 1)
+
+    def test_empty_collection(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='newuser', password='testpass'))
+        response = self.client.get('/api/monsters/collection-summary/')
+        self.assertEqual((response.data['total_monsters'], response.data['average_level']), (0, 0))
+        self.assertEqual(response.data['catalogue_size'], 4)
+
 class MonsterModelTests(TestCase):
     def setUp(self):
         self.monster = Monster.objects.create(
@@ -82,6 +383,21 @@ class PlayerMonsterTests(TestCase):
         self.player_monster.increment_level(2)
         self.assertEqual(self.player_monster.level, PlayerMonster.MAX_LEVEL)
         
+    def test_bulk_level_up(self):
+        other_monster = Monster.objects.create(name='OtherMonster', type='W', rarity='R')
+        maxed_monster = PlayerMonster.objects.create(
+            user=self.user,
+            monster=other_monster,
+            level=PlayerMonster.MAX_LEVEL
+        )
+
+        PlayerMonster.objects.filter(user=self.user).level_up()
+
+        self.player_monster.refresh_from_db()
+        maxed_monster.refresh_from_db()
+        self.assertEqual(self.player_monster.level, 2)
+        self.assertEqual(maxed_monster.level, PlayerMonster.MAX_LEVEL)
+
     def test_string_representation(self):
         expected_str = f"testuser's TestMonster (Level: 1)"
         self.assertEqual(str(self.player_monster), expected_str)
\ No newline at end of file
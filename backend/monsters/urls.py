@@ -6,5 +6,7 @@ urlpatterns = [
     path('create-player-monster/', views.create_player_monster, name='create-player-monster'),
     path('increment-level/', views.increment_player_monster_level, name='increment-player-monster'),
     path('random-monster/', views.generate_random_monster, name='random-monster'),
-    path('get-player-monsters/', views.get_player_monsters, name='get-player-monsters')
+    path('pull/', views.pull_monsters, name='pull-monsters'),
+    path('get-player-monsters/', views.get_player_monsters, name='get-player-monsters'),
+    path('collection-summary/', views.get_collection_summary, name='collection-summary'),
 ]
\ No newline at end of file
@@ -1,13 +1,20 @@
 
 from django.shortcuts import render,get_object_or_404
+from django.db import transaction
 from .models import PlayerMonster
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import MonsterSerializer,PlayerMonsterSerializer
-from .models import Monster
-from random import choices
+from .models import Monster, PityCounter
+from .spawner import spawn_random_monster
+from .drops import get_drop_table, resolve_pulls
+from game.score_cache import invalidate_hands
+from .listing import parse_listing_params, list_player_monsters, serialize_player_monsters
+from .summary import get_collection_summary as build_collection_summary
+
+MAX_PULLS = 10
 
 # Create your views here.
 @api_view(['POST'])
@@ -41,13 +48,11 @@ def create_player_monster(request):
     monster_id = request.data.get('monster_id')
     monster = get_object_or_404(Monster, pk=monster_id)
     
-    # Create player monster instance
-    player_monster = PlayerMonster.objects.create(
-        user=request.user,
-        monster=monster,
-        level=1,
-    )
     try:
+        # A monster the user already has is levelled up, as a user can only have each one once
+        player_monster = PlayerMonster.objects.grant(request.user, monster)
+        # The upsert skips the save signals that would drop the user's cached hands
+        invalidate_hands(request.user.id)
         serializer = PlayerMonsterSerializer(player_monster)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     except Exception as e:
@@ -59,50 +64,88 @@ def create_player_monster(request):
 def generate_random_monster(request):
     monster_type = request.data.get('type')
 
+    player_monster = spawn_random_monster(request.user, monster_type)
     # Validate monster type
-    if not Monster.objects.filter(type=monster_type).exists():
+    if player_monster is None:
         return Response(
             {'error': f'Invalid monster type: {monster_type}'}, 
             status=status.HTTP_404_NOT_FOUND
         )
-    
-    rarities = ['C', 'R', 'E', 'L']  # The possible outcomes
-    weights = [0.6, 0.25, 0.1, 0.05]  
-    
-    selected_rarity = choices(rarities, weights=weights)[0]
-    selected_monster = Monster.objects.get(type=monster_type, rarity=selected_rarity)
-    
-    # Check if user already has this monster
-    existing_player_monster = PlayerMonster.objects.filter(
-        user=request.user,
-        monster=selected_monster
-    ).first()
-    
-    if existing_player_monster:
-        # Increment level of existing monster
-        existing_player_monster.increment_level(1)
-        serializer = PlayerMonsterSerializer(existing_player_monster)
-        print(existing_player_monster)
 
-    else:
-        # Create new player monster
-        player_monster = PlayerMonster.objects.create(
-            user=request.user,
-            monster=selected_monster,
-            level=1
-        )
-        print(player_monster)
-        serializer = PlayerMonsterSerializer(player_monster)
-    
+    serializer = PlayerMonsterSerializer(player_monster)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def pull_monsters(request):
+    # Draws count monsters of a type from its drop table (or an event's), with pity guaranteeing
+    # rarer drops after long dry runs. Every pull is granted in one upsert, and the pity counters
+    # are locked for the request so concurrent pulls can't both spend the same pity
+    monster_type = request.data.get('type')
+    event = request.data.get('event')
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        return Response({'error': 'count must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < count <= MAX_PULLS:
+        return Response({'error': f'count must be between 1 and {MAX_PULLS}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        table_name, table = get_drop_table(monster_type, event)
+    except KeyError:
+        return Response({'error': f'Unknown event: {event}'}, status=status.HTTP_404_NOT_FOUND)
+
+    with transaction.atomic():
+        pity, _ = PityCounter.objects.select_for_update().get_or_create(user=request.user, table=table_name)
+        pulls = resolve_pulls(monster_type, table, pity.counters, count)
+        if pulls is None:
+            # Leaving the block rolls back a counter row created just now
+            transaction.set_rollback(True)
+            return Response(
+                {'error': f'Invalid monster type: {monster_type}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        player_monsters = PlayerMonster.objects.grant_many(request.user, [(monster, 1) for monster, _ in pulls])
+        pity.save(update_fields=['counters'])
+    # The upsert skips the save signals that would drop the user's cached hands
+    invalidate_hands(request.user.id)
+
+    # A monster pulled twice has one row, so it's only listed once
+    unique_player_monsters = list({player_monster.id: player_monster for player_monster in player_monsters}.values())
+    return Response({
+        'pulls': [
+            {'monster': MonsterSerializer(monster).data, 'pity': forced}
+            for monster, forced in pulls
+        ],
+        'player_monsters': PlayerMonsterSerializer(unique_player_monsters, many=True).data,
+        'table': table_name,
+        'pity_counters': pity.counters,
+    }, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_player_monsters(request):
     try:
-        player_monsters = PlayerMonster.objects.filter(user=request.user)
-        serializer = PlayerMonsterSerializer(player_monsters, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        options = parse_listing_params(request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        rows, next_cursor = list_player_monsters(request.user, options)
+        data = serialize_player_monsters(rows, options)
+        # Without page_size or cursor the whole collection comes back as a plain list, as it always has
+        if options['paginate']:
+            data = {'results': data, 'next_cursor': next_cursor}
+        return Response(data, status=status.HTTP_200_OK)
     except Exception as e:
         # not useful but will bung in here for now
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_collection_summary(request):
+    # Counts and completion for the profile and home pages, without sending the collection
+    try:
+        return Response(build_collection_summary(request.user), status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
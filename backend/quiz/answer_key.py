@@ -0,0 +1,46 @@
+import threading
+from backend.cache_versions import get_version, invalidate_version
+
+ANSWER_VERSION_KEY = 'quiz-answer-version'
+
+# Question id -> answer, filled in as questions are checked. Answers rarely change, so this
+# process keeps them and only checks their version stamp on each request
+_answers = {}
+_version = None
+_lock = threading.Lock()
+
+def get_answer_version():
+    return get_version(ANSWER_VERSION_KEY)
+
+def get_answers(question_ids):
+    # Returns {question_id: answer} for the ids that exist. Only ids this process hasn't seen
+    # since the answers last changed are looked up, in one query
+    global _version
+    version = get_answer_version()
+    with _lock:
+        if version != _version:
+            _answers.clear()
+            _version = version
+        found = {question_id: _answers[question_id] for question_id in question_ids if question_id in _answers}
+
+    missing = [question_id for question_id in question_ids if question_id not in found]
+    if missing:
+        # Imported here as the models module imports this one for its signals
+        from .models import QuizQuestion
+        loaded = dict(QuizQuestion.objects.filter(id__in=missing).values_list('id', 'answer'))
+        with _lock:
+            # Answers that changed while they were loading are left for the next request
+            if _version == version:
+                _answers.update(loaded)
+        found.update(loaded)
+    return found
+
+def clear_local_answers():
+    # Empties this process's copy without touching other processes, for the benchmark
+    global _version
+    with _lock:
+        _answers.clear()
+        _version = None
+
+def invalidate_answers():
+    invalidate_version(ANSWER_VERSION_KEY)
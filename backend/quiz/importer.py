@@ -0,0 +1,84 @@
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .answer_key import invalidate_answers
+from .models import QuizQuestion
+from .question_pool import invalidate_question_pool
+from .serializers import QuestionSerializer
+
+FORMATS = ['csv', 'jsonl']
+# Rows validated and inserted together, each chunk in its own transaction
+DEFAULT_CHUNK_SIZE = 1000
+# Only the first row errors are kept, so a bad file can't fill up memory with them
+MAX_REPORTED_ERRORS = 100
+
+def get_format(filename, requested=None):
+    # Returns 'csv' or 'jsonl' from the requested format or the file extension, or None
+    if requested:
+        return requested if requested in FORMATS else None
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+def iter_rows(lines, file_format):
+    # Yields one dict per question from a text stream, reading a line at a time. A JSON line
+    # that can't be parsed is yielded as it is so it gets reported against its row number
+    if file_format == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+def import_questions(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Validates rows with QuestionSerializer and bulk inserts the valid ones chunk by chunk.
+    # Returns {'created', 'failed', 'errors'} with errors as [{'row', 'errors'}], rows counting from 1
+    created = 0
+    failed = 0
+    errors = []
+    rows = iter(rows)
+    row_number = 0
+    # One serializer validates every row, the same way many=True does, rather than
+    # building its fields again for each row
+    serializer = QuestionSerializer()
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        questions = []
+        for row in chunk:
+            row_number += 1
+            if not isinstance(row, dict):
+                row_errors = {'non_field_errors': ['Row is not a JSON object']}
+            else:
+                try:
+                    questions.append(QuizQuestion(**serializer.run_validation(row)))
+                    continue
+                except ValidationError as e:
+                    row_errors = e.detail
+
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'errors': row_errors})
+
+        with transaction.atomic():
+            QuizQuestion.objects.bulk_create(questions)
+            # bulk_create doesn't send the save signals, so the caches they'd drop are dropped here.
+            # Per chunk, so the chunks already committed reach the caches even if a later one fails
+            for question_type in {question.type for question in questions}:
+                invalidate_question_pool(question_type)
+            if questions:
+                invalidate_answers()
+        created += len(questions)
+
+    return {'created': created, 'failed': failed, 'errors': errors}
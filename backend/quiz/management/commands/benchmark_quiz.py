@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+from backend.benchmarking import format_stats, throwaway_database, time_calls, write_results
+from quiz.answer_key import clear_local_answers
+from quiz.models import QuizQuestion
+
+# Questions per type in the seeded question bank
+QUESTIONS_PER_TYPE = 200
+
+class Command(BaseCommand):
+    help = "Benchmarks check-answer/ and check-answers/ with and without the in-memory answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint benchmark")
+        parser.add_argument('--batch-size', type=int, default=10, help="Answers sent per check-answers request")
+        parser.add_argument('--output', default='benchmark-results/quiz.json', help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            results = self.benchmark_requests(options['requests'], options['batch_size'])
+
+        write_results(options['output'], 'quiz', results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def benchmark_requests(self, requests, batch_size):
+        user = User.objects.create_user(username='benchmark', password='benchmarkpass123')
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                question_text=f'Question {index}', choice1='a', choice2='b', choice3='c', choice4='d',
+                answer=index % 4, type=question_type
+            )
+            for question_type, _ in QuizQuestion.TYPES
+            for index in range(QUESTIONS_PER_TYPE)
+        ])
+        question_ids = list(QuizQuestion.objects.values_list('id', flat=True)[:batch_size])
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        single_body = {'question_id': question_ids[0], 'answer': 0}
+        batch_body = {'answers': [{'question_id': question_id, 'answer': 0} for question_id in question_ids]}
+
+        def uncached(url, body):
+            # Forgets the answers before every request, which is what checking cost before the cache
+            def call():
+                clear_local_answers()
+                client.post(url, body, format='json')
+            return call
+
+        endpoints = {
+            'check-answer/uncached': uncached(reverse('check-answer'), single_body),
+            'check-answer/cached': lambda: client.post(reverse('check-answer'), single_body, format='json'),
+            'check-answers/uncached': uncached(reverse('check-answers'), batch_body),
+            'check-answers/cached': lambda: client.post(reverse('check-answers'), batch_body, format='json'),
+        }
+        results = {}
+        for name, func in endpoints.items():
+            results[name] = time_calls(func, requests, warmup=10)
+            self.stdout.write(f"{name:>22}: {format_stats(results[name])}")
+        return results
@@ -0,0 +1,36 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from quiz.importer import FORMATS, DEFAULT_CHUNK_SIZE, get_format, iter_rows, import_questions
+
+class Command(BaseCommand):
+    help = "Imports quiz questions from a CSV or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV with a header row, or one JSON object per line")
+        parser.add_argument('--format', choices=FORMATS, help="Read the file as this format instead of going by its extension")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows validated and inserted per transaction")
+        parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+
+    def handle(self, *args, **options):
+        file_format = get_format(options['path'], options['format'])
+        if file_format is None:
+            raise CommandError("Can't tell the file format from its extension, pass --format")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        try:
+            # newline='' lets the csv module handle line breaks inside quoted fields
+            with open(options['path'], newline='', encoding='utf-8-sig') as lines:
+                result = import_questions(iter_rows(lines, file_format), options['chunk_size'])
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"Imported {result['created']} questions, {result['failed']} rows failed")
+        for error in result['errors']:
+            self.stdout.write(f"  row {error['row']}: {json.dumps(error['errors'])}")
+        if result['failed'] > len(result['errors']):
+            self.stdout.write(f"  ...and {result['failed'] - len(result['errors'])} more")
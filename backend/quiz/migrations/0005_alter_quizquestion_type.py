@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_quizquestion_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizquestion',
+            name='type',
+            field=models.CharField(choices=[('F&D', 'Food and Drink'), ('HWB', 'Health and Wellbeing'), ('W', 'Water'), ('E', 'Energy'), ('WA', 'Waste'), ('N&B', 'Nature and Biodiversity')], db_index=True, max_length=3),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.19 on 2026-10-18 11:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0005_alter_quizquestion_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('served', models.PositiveIntegerField(default=0)),
+                ('recent', models.JSONField(default=list)),
+                ('missed', models.JSONField(default=list)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_history', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
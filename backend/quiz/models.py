@@ -1,4 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import User
+from .question_pool import invalidate_question_pool
+from .answer_key import invalidate_answers
 
 class QuizQuestion(models.Model):
     question_text = models.CharField(max_length=200)
@@ -15,4 +20,32 @@ class QuizQuestion(models.Model):
         ('WA', 'Waste'),
         ('N&B', 'Nature and Biodiversity'),
     ]
-    type = models.CharField(max_length=3, choices=TYPES)
+    # Indexed as questions are always picked by type
+    type = models.CharField(max_length=3, choices=TYPES, db_index=True)
+    # Moves on every save, so the catalogue endpoints can tell when it last changed
+    updated_at = models.DateTimeField(auto_now=True)
+
+class QuizHistory(models.Model):
+    # What the scheduler remembers about a user's questions, see scheduler.py. It stays the
+    # same size however many questions the user answers
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='quiz_history')
+    served = models.PositiveIntegerField(default=0)
+    # [question_id, type] or null for each of the last RECENT_SIZE questions served
+    recent = models.JSONField(default=list)
+    # [question_id, due at, interval, type] for each missed question, oldest first
+    missed = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.user.username}'s quiz history"
+
+# Any question saved or deleted changes the ids its type picks from
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def invalidate_question_ids(sender, instance, **kwargs):
+    invalidate_question_pool(instance.type)
+
+# Any question saved or deleted may change an answer this or another process has kept
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def invalidate_cached_answers(sender, instance, **kwargs):
+    invalidate_answers()
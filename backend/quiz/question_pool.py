@@ -0,0 +1,27 @@
+import threading
+from backend.cache_versions import get_version, invalidate_version
+
+# Question ids for each type, kept in this process as (version, [ids]) and reloaded when a
+# question of the type is saved or deleted
+_pools = {}
+_lock = threading.Lock()
+
+def get_pool_version(question_type):
+    return get_version(f'quiz-pool-version:{question_type}')
+
+def get_question_ids(question_type):
+    version = get_pool_version(question_type)
+    with _lock:
+        pool = _pools.get(question_type)
+    if pool is None or pool[0] != version:
+        # Imported here as the models module imports this one for its signals
+        from .models import QuizQuestion
+        # Served from the type index alone, the rows themselves are never read
+        ids = list(QuizQuestion.objects.filter(type=question_type).order_by('id').values_list('id', flat=True))
+        pool = (version, ids)
+        with _lock:
+            _pools[question_type] = pool
+    return pool[1]
+
+def invalidate_question_pool(question_type):
+    invalidate_version(f'quiz-pool-version:{question_type}')
@@ -0,0 +1,167 @@
+import random
+from django.core.cache import cache
+from django.db import transaction
+from .question_pool import get_question_ids, invalidate_question_pool
+
+# Questions served recently that won't be picked again while they're in the ring buffer
+RECENT_SIZE = 30
+# Most wrongly answered questions kept for each user, the oldest is forgotten first
+MAX_MISSED = 50
+# Questions served before a wrong answer comes back, doubled every time it's then answered right
+FIRST_INTERVAL = 2
+# A missed question answered right at this interval counts as learnt and is dropped
+MAX_INTERVAL = 16
+# Random picks tried before giving up on avoiding the recent questions
+PICK_ATTEMPTS = 8
+# Seconds the ids a user's answers can affect stay cached, see can_change_history
+ANSWERABLE_TIMEOUT = 60 * 10
+
+# A user's history is a QuizHistory row of a fixed size whatever the user has answered, so
+# it survives restarts and cache evictions. In memory it is a dict of:
+#   served - questions served so far, which the due times count in
+#   recent - ring buffer of (question_id, type) for the last RECENT_SIZE questions served
+#   missed - question_id -> (due at served count, interval, type) for wrong answers, oldest first
+
+def lock_history(user_id):
+    # Returns the user's QuizHistory row, locked until the surrounding transaction ends so
+    # concurrent answers can't overwrite each other's updates
+    from .models import QuizHistory
+    row, _ = QuizHistory.objects.select_for_update().get_or_create(user_id=user_id)
+    return row
+
+def get_answerable_key(user_id):
+    return f'quiz-answerable:{user_id}'
+
+def get_answerable(history):
+    # The ids an answer can change the history for: any recent question if it's answered wrong,
+    # and recent questions that were missed before if it's answered right
+    recent = {entry[0] for entry in history['recent'] if entry is not None}
+    return {'recent': recent, 'missed': recent & set(history['missed'])}
+
+def load_history(row):
+    return {
+        'served': row.served,
+        # Padded or cut in case RECENT_SIZE has changed since the row was saved
+        'recent': (row.recent + [None] * RECENT_SIZE)[:RECENT_SIZE],
+        'missed': {question_id: (due_at, interval, question_type) for question_id, due_at, interval, question_type in row.missed},
+    }
+
+def save_history(row, history):
+    row.served = history['served']
+    row.recent = history['recent']
+    # A list rather than an object, as JSON object keys would turn the ids into strings
+    row.missed = [[question_id, *entry] for question_id, entry in history['missed'].items()]
+    row.save(update_fields=['served', 'recent', 'missed'])
+    # Dropped again after commit, so an answer that read the old row mid-transaction can't keep it
+    key = get_answerable_key(row.user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+def choose_question_id(history, question_type, question_ids):
+    # A missed question of this type that's due comes first, the most overdue of them
+    due = [
+        (due_at, question_id)
+        for question_id, (due_at, interval, missed_type) in history['missed'].items()
+        if missed_type == question_type and due_at <= history['served']
+    ]
+    if due:
+        return min(due)[1]
+
+    recent = {entry[0] for entry in history['recent'] if entry is not None}
+    if len(question_ids) <= 2 * RECENT_SIZE:
+        # Small pools are checked in full, and if everything is recent the one served longest ago is repeated
+        unseen = [question_id for question_id in question_ids if question_id not in recent]
+        if unseen:
+            return random.choice(unseen)
+        position = history['served'] % RECENT_SIZE
+        ring = history['recent'][position:] + history['recent'][:position]
+        # Oldest first, so later repeats of a question overwrite its earlier position
+        last_served = {entry[0]: index for index, entry in enumerate(ring) if entry is not None}
+        oldest = min(
+            ((index, question_id) for question_id, index in last_served.items() if question_id in question_ids),
+            default=None
+        )
+        if oldest is not None:
+            return oldest[1]
+
+    # In large pools at most half the ids are recent, so a few random picks almost always find one
+    for attempt in range(PICK_ATTEMPTS):
+        question_id = random.choice(question_ids)
+        if question_id not in recent:
+            break
+    return question_id
+
+def next_question(user_id, question_type):
+    # Returns the question to serve the user next, or None if the type has no questions
+    from .models import QuizQuestion
+    with transaction.atomic():
+        row = lock_history(user_id)
+        history = load_history(row)
+        for attempt in range(2):
+            question_ids = get_question_ids(question_type)
+            if not question_ids:
+                return None
+            question_id = choose_question_id(history, question_type, question_ids)
+            question = QuizQuestion.objects.filter(pk=question_id, type=question_type).first()
+            if question is not None:
+                history['recent'][history['served'] % RECENT_SIZE] = (question_id, question_type)
+                history['served'] += 1
+                save_history(row, history)
+                return question
+            # The question was deleted or changed type, so forget it and reload the pool
+            history['missed'].pop(question_id, None)
+            invalidate_question_pool(question_type)
+        save_history(row, history)
+    return None
+
+def can_change_history(user_id, results):
+    # Most answers change nothing, a right answer to a question never missed or any answer to
+    # a question served too long ago. Those are spotted from the cache without touching the
+    # database, or with one unlocked read when it isn't cached. Users with no history can't
+    # have served questions to answer, so no row is made for them
+    from .models import QuizHistory
+    answerable = cache.get(get_answerable_key(user_id))
+    if answerable is None:
+        row = QuizHistory.objects.filter(user_id=user_id).first()
+        answerable = get_answerable(load_history(row)) if row else {'recent': set(), 'missed': set()}
+        cache.set(get_answerable_key(user_id), answerable, ANSWERABLE_TIMEOUT)
+    return any(
+        question_id in answerable['missed'] if correct else question_id in answerable['recent']
+        for question_id, correct in results
+    )
+
+def record_answers(user_id, results):
+    # Takes [(question_id, correct)] and schedules wrong answers to come back. Only questions
+    # still in the ring buffer are tracked, as that's where their type is known from
+    if not can_change_history(user_id, results):
+        return
+
+    from .models import QuizHistory
+    with transaction.atomic():
+        row = QuizHistory.objects.select_for_update().filter(user_id=user_id).first()
+        if row is None:
+            return
+        history = load_history(row)
+        types = {entry[0]: entry[1] for entry in history['recent'] if entry is not None}
+        missed = history['missed']
+        changed = False
+
+        for question_id, correct in results:
+            if question_id not in types:
+                continue
+            if not correct:
+                missed.pop(question_id, None)
+                missed[question_id] = (history['served'] + FIRST_INTERVAL, FIRST_INTERVAL, types[question_id])
+                if len(missed) > MAX_MISSED:
+                    del missed[next(iter(missed))]
+                changed = True
+            elif question_id in missed:
+                interval = missed[question_id][1] * 2
+                if interval > MAX_INTERVAL:
+                    del missed[question_id]
+                else:
+                    missed[question_id] = (history['served'] + interval, interval, types[question_id])
+                changed = True
+
+        if changed:
+            save_history(row, history)
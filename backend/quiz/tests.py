@@ -3,8 +3,16 @@ from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import QuizQuestion
+from .models import QuizQuestion, QuizHistory
 from .serializers import QuestionSerializer, QuestionTextSerializer
+from .scheduler import FIRST_INTERVAL, RECENT_SIZE
+from .importer import iter_rows, import_questions
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from io import StringIO
+import os
+import tempfile
 import json
 
 class QuizQuestionModelTests(TestCase):
@@ -228,4 +236,278 @@ class APIViewsTest(APITestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-        self.assertIn('error', response.data)
\ No newline at end of file
+        self.assertIn('error', response.data)
+
+class CheckAnswersTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='batchuser', password='testpassword123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.questions = [
+            QuizQuestion.objects.create(
+                question_text=f"Question {index}", choice1="a", choice2="b", choice3="c", choice4="d",
+                answer=index, type="W"
+            )
+            for index in range(3)
+        ]
+        self.url = reverse('check-answers')
+
+    def test_check_answers(self):
+        answers = [
+            {'question_id': self.questions[0].id, 'answer': 0},
+            {'question_id': self.questions[1].id, 'answer': 3},
+            {'question_id': self.questions[2].id, 'answer': 2},
+            {'question_id': 999999, 'answer': 0},
+        ]
+        # The answers and the user's quiz history, which they have none of yet
+        with self.assertNumQueries(2):
+            response = self.client.post(self.url, {'answers': answers}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['correct'] for result in response.data['results']], [True, False, True, False])
+        self.assertIn('error', response.data['results'][3])
+        self.assertEqual(response.data['correct_count'], 2)
+        self.assertEqual(response.data['total'], 4)
+
+    def test_invalid_answers(self):
+        for answers in [None, [], [{'answer': 0}], [{'question_id': 'abc', 'answer': 0}],
+                        [{'question_id': self.questions[0].id, 'answer': 0}] * 101]:
+            response = self.client.post(self.url, {'answers': answers}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AnswerKeyTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='keyuser', password='testpassword123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.question = QuizQuestion.objects.create(
+            question_text="Question", choice1="a", choice2="b", choice3="c", choice4="d", answer=1, type="W"
+        )
+        self.url = reverse('check-answer')
+
+    def test_warm_answer_key_skips_database(self):
+        self.client.post(self.url, {'question_id': self.question.id, 'answer': 1}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {'question_id': self.question.id, 'answer': 1}, format='json')
+        self.assertTrue(response.data['correct'])
+        # Answering without ever being served a question doesn't make a history
+        self.assertFalse(QuizHistory.objects.exists())
+
+    def test_warm_answers_after_served_question(self):
+        self.client.get(reverse('get-question', kwargs={'monster_type': 'W'}))
+        self.client.post(self.url, {'question_id': self.question.id, 'answer': 1}, format='json')
+        # A right answer to a question that was never missed changes nothing, so isn't locked for
+        with self.assertNumQueries(0):
+            self.client.post(self.url, {'question_id': self.question.id, 'answer': 1}, format='json')
+        # A wrong one locks the history and saves the miss
+        with self.assertNumQueries(4):
+            self.client.post(self.url, {'question_id': self.question.id, 'answer': 2}, format='json')
+        self.assertEqual(QuizHistory.objects.get(user=self.user).missed[0][0], self.question.id)
+
+    def test_edited_and_deleted_answers(self):
+        self.client.post(self.url, {'question_id': self.question.id, 'answer': 1}, format='json')
+
+        self.question.answer = 3
+        self.question.save()
+        response = self.client.post(self.url, {'question_id': self.question.id, 'answer': 3}, format='json')
+        self.assertTrue(response.data['correct'])
+
+        question_id = self.question.id
+        self.question.delete()
+        response = self.client.post(self.url, {'question_id': question_id, 'answer': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class QuestionPoolTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pooluser', password='testpassword123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.questions = [
+            QuizQuestion.objects.create(
+                question_text=f"Water question {index}", choice1="a", choice2="b", choice3="c", choice4="d",
+                answer=0, type="W"
+            )
+            for index in range(3)
+        ]
+        QuizQuestion.objects.create(
+            question_text="Energy question", choice1="a", choice2="b", choice3="c", choice4="d", answer=0, type="E"
+        )
+        self.url = reverse('get-question', kwargs={'monster_type': 'W'})
+
+    def test_picks_only_from_type(self):
+        texts = {self.client.get(self.url).data['question_text'] for _ in range(20)}
+        self.assertTrue(texts <= {question.question_text for question in self.questions})
+
+    def test_pool_not_reloaded_once_loaded(self):
+        self.client.get(self.url)
+        # The question itself, plus the savepoint, locked read and save of the user's quiz history
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+
+    def test_pool_follows_changes(self):
+        self.client.get(self.url)
+        for question in self.questions[1:]:
+            question.delete()
+        self.questions[0].type = "E"
+        self.questions[0].save()
+        new_question = QuizQuestion.objects.create(
+            question_text="New water question", choice1="a", choice2="b", choice3="c", choice4="d", answer=0, type="W"
+        )
+
+        for _ in range(5):
+            self.assertEqual(self.client.get(self.url).data['id'], new_question.id)
+
+    def test_no_questions_for_type(self):
+        for monster_type in ['WA', 'XYZ']:
+            response = self.client.get(reverse('get-question', kwargs={'monster_type': monster_type}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class QuizSchedulerTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='scheduleuser', password='testpassword123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.questions = [
+            QuizQuestion.objects.create(
+                question_text=f"Question {index}", choice1="a", choice2="b", choice3="c", choice4="d",
+                answer=0, type="W"
+            )
+            for index in range(5)
+        ]
+        self.url = reverse('get-question', kwargs={'monster_type': 'W'})
+
+    def get_question_id(self):
+        return self.client.get(self.url).data['id']
+
+    def test_no_repeats_until_pool_used_up(self):
+        served = [self.get_question_id() for _ in range(5)]
+        self.assertEqual(sorted(served), sorted(question.id for question in self.questions))
+        # Once everything is recent the oldest comes round again
+        self.assertEqual(self.get_question_id(), served[0])
+
+    def test_wrong_answer_comes_back(self):
+        question_id = self.get_question_id()
+        self.client.post(reverse('check-answer'), {'question_id': question_id, 'answer': 3}, format='json')
+
+        served = [self.get_question_id() for _ in range(FIRST_INTERVAL + 1)]
+        self.assertNotIn(question_id, served[:FIRST_INTERVAL])
+        self.assertEqual(served[FIRST_INTERVAL], question_id)
+
+        # Answering it right pushes it back further instead of dropping it straight away
+        self.client.post(
+            reverse('check-answers'), {'answers': [{'question_id': question_id, 'answer': 0}]}, format='json'
+        )
+        served = [self.get_question_id() for _ in range(FIRST_INTERVAL * 2)]
+        self.assertNotIn(question_id, served)
+
+    def test_history_outlives_cache(self):
+        question_id = self.get_question_id()
+        self.client.post(reverse('check-answer'), {'question_id': question_id, 'answer': 3}, format='json')
+        cache.clear()
+
+        served = [self.get_question_id() for _ in range(FIRST_INTERVAL + 1)]
+        self.assertEqual(served[FIRST_INTERVAL], question_id)
+        history = QuizHistory.objects.get(user=self.user)
+        self.assertEqual(history.served, FIRST_INTERVAL + 2)
+        self.assertEqual([entry[0] for entry in history.missed], [question_id])
+
+    def test_large_pool_avoids_recent(self):
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(question_text=f"Bulk {index}", choice1="a", choice2="b", choice3="c", choice4="d",
+                         answer=0, type="W")
+            for index in range(RECENT_SIZE * 4)
+        ])
+        # bulk_create skips the signals so the pool has to be told
+        QuizQuestion.objects.first().save()
+
+        served = [self.get_question_id() for _ in range(RECENT_SIZE)]
+        self.assertEqual(len(set(served)), RECENT_SIZE)
+
+class QuestionImportTests(APITestCase):
+    CSV = (
+        "question_text,choice1,choice2,choice3,choice4,answer,type\n"
+        "\"Which bin, usually?\",Green,Blue,Black,Red,1,WA\n"
+        "Missing answer,a,b,c,d,,WA\n"
+        "Bad type,a,b,c,d,0,XYZ\n"
+        "Saves water?,Showers,Baths,Hoses,Sprinklers,0,W\n"
+    )
+    JSONL = (
+        '{"question_text": "Cycle or drive?", "choice1": "Cycle", "choice2": "Drive", '
+        '"choice3": "Fly", "choice4": "Taxi", "answer": 0, "type": "E"}\n'
+        '\n'
+        'not json\n'
+        '[1, 2]\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='importadmin', password='adminpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.import_url = reverse('admin-import-quiz-questions')
+
+    def test_import_csv_reports_bad_rows(self):
+        result = import_questions(iter_rows(StringIO(self.CSV), 'csv'), chunk_size=2)
+
+        self.assertEqual((result['created'], result['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+        self.assertIn('answer', result['errors'][0]['errors'])
+        self.assertIn('type', result['errors'][1]['errors'])
+        self.assertTrue(QuizQuestion.objects.filter(question_text="Which bin, usually?", answer=1).exists())
+
+    def test_import_jsonl(self):
+        result = import_questions(iter_rows(StringIO(self.JSONL), 'jsonl'))
+        self.assertEqual((result['created'], result['failed']), (1, 2))
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+
+    def test_imported_questions_reach_caches(self):
+        # Load the pool for the type before importing into it
+        self.assertEqual(self.client.get(reverse('get-question', kwargs={'monster_type': 'E'})).status_code, 404)
+        import_questions(iter_rows(StringIO(self.JSONL), 'jsonl'))
+
+        response = self.client.get(reverse('get-question', kwargs={'monster_type': 'E'}))
+        self.assertEqual(response.data['question_text'], "Cycle or drive?")
+
+    def test_failed_import_keeps_committed_chunks_in_caches(self):
+        self.assertEqual(self.client.get(reverse('get-question', kwargs={'monster_type': 'E'})).status_code, 404)
+
+        def rows():
+            yield json.loads(self.JSONL.splitlines()[0])
+            raise OSError("Upload cut off")
+
+        with self.assertRaises(OSError):
+            import_questions(rows(), chunk_size=1)
+
+        response = self.client.get(reverse('get-question', kwargs={'monster_type': 'E'}))
+        self.assertEqual(response.data['question_text'], "Cycle or drive?")
+
+    def test_admin_upload(self):
+        upload = SimpleUploadedFile('questions.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(QuizQuestion.objects.count(), 2)
+
+    def test_admin_upload_rejected(self):
+        upload = SimpleUploadedFile('questions.txt', self.CSV.encode())
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=User.objects.create_user(username='player', password='playerpass123'))
+        upload = SimpleUploadedFile('questions.csv', self.CSV.encode())
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as questions_file:
+            questions_file.write(self.JSONL)
+        self.addCleanup(os.remove, questions_file.name)
+        out = StringIO()
+        call_command('import_questions', questions_file.name, stdout=out)
+        self.assertIn("Imported 1 questions, 2 rows failed", out.getvalue())
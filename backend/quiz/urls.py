@@ -5,4 +5,5 @@ urlpatterns = [
     path('create-question/', views.create_question, name='create-question'),
     path('get-question/<str:monster_type>/', views.get_question_text, name='get-question'),
     path('check-answer/', views.check_answer, name='check-answer'),
+    path('check-answers/', views.check_answers, name='check-answers'),
 ]
@@ -5,8 +5,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import QuestionSerializer, QuestionTextSerializer
 from .models import QuizQuestion
+from .scheduler import next_question, record_answers
+from .answer_key import get_answers
 from monsters.models import Monster
-import random
+
+QUESTION_TYPES = dict(QuizQuestion.TYPES)
+# Most answers accepted in one check-answers request
+MAX_BATCH_ANSWERS = 100
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -27,13 +32,15 @@ def create_question(request):
 @permission_classes([IsAuthenticated])
 def get_question_text(request, monster_type):
     try:
-        # gets the type of the monster and picks a random question from that type
-        questions = QuizQuestion.objects.filter(type=monster_type)
-        chosen_question = random.choice(questions)
+        # gets the type of the monster and picks a question from that type the user
+        # hasn't seen recently, or one they got wrong that's due to come back
+        chosen_question = None
+        if monster_type in QUESTION_TYPES:
+            chosen_question = next_question(request.user.id, monster_type)
+        if chosen_question is None:
+            return Response({'error': 'No questions found for this monster type'}, status=status.HTTP_404_NOT_FOUND)
         serializer = QuestionTextSerializer(chosen_question)
         return Response(serializer.data)
-    except QuizQuestion.DoesNotExist:
-        return Response({'error': 'No questions found for this monster type'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -43,13 +50,56 @@ def check_answer(request):
     try:
         question_id = request.data.get('question_id')
         user_answer = request.data.get('answer')
-        
-        question = QuizQuestion.objects.get(pk=question_id)
-        if question.answer == user_answer:
-            return Response({'correct': True})
-        else:
-            return Response({'correct': False})
-    except QuizQuestion.DoesNotExist:
-        return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+        if question_id is None:
+            return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Checked against the in-memory answer key, which only queries for questions it hasn't seen
+        question_id = int(question_id)
+        answer_key = get_answers([question_id])
+        if question_id not in answer_key:
+            return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        correct = answer_key[question_id] == user_answer
+        record_answers(request.user.id, [(question_id, correct)])
+        return Response({'correct': correct})
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def check_answers(request):
+    # Checks a whole quiz of {question_id, answer} pairs with at most one query
+    answers = request.data.get('answers')
+    if not isinstance(answers, list) or not answers:
+        return Response({'error': 'answers must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(answers) > MAX_BATCH_ANSWERS:
+        return Response(
+            {'error': f'At most {MAX_BATCH_ANSWERS} answers can be checked at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        question_ids = [int(answer['question_id']) for answer in answers]
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {'error': 'Every answer needs a numeric question_id'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        answer_key = get_answers(question_ids)
+
+        results = []
+        for question_id, answer in zip(question_ids, answers):
+            if question_id not in answer_key:
+                results.append({'question_id': question_id, 'correct': False, 'error': 'Question not found'})
+            else:
+                results.append({'question_id': question_id, 'correct': answer_key[question_id] == answer.get('answer')})
+
+        record_answers(request.user.id, [
+            (result['question_id'], result['correct']) for result in results if 'error' not in result
+        ])
+        correct_count = sum(result['correct'] for result in results)
+        return Response({'results': results, 'correct_count': correct_count, 'total': len(results)})
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,3 +1,4 @@
+import codecs
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -13,6 +14,13 @@ from quiz.serializers import QuestionSerializer
 from location.serializers import LocationSerializer
 from game.models import GameChallenge
 from game.serializers import GameChallengeSerializer
+from game.simulator import run_simulation, summarise_simulation
+from game.score_cache import invalidate_hands
+from backend.conditional import conditional_list_response
+from quiz.importer import get_format as get_question_file_format, iter_rows, import_questions
+
+# Cap on hands per hand size and level band for simulations run through the API
+MAX_SIMULATION_SAMPLES = 20000
 
 # Admin permission check - now uses is_superuser
 def is_admin(user):
@@ -77,9 +85,7 @@ def get_all_monsters(request):
         return Response({"error": "Admin privileges required"}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        monsters = Monster.objects.all()
-        serializer = MonsterSerializer(monsters, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_list_response(request, Monster.objects.all(), MonsterSerializer)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -118,17 +124,12 @@ def add_monster_to_user(request, user_id):
         except Monster.DoesNotExist:
             return Response({"error": "Monster not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Check if user already has this monster
-        existing_monster = PlayerMonster.objects.filter(user=user, monster=monster).first()
-        if existing_monster:
+        # Create new player monster, unless the user already has it. One statement, so two
+        # admins adding the same monster at once can't both succeed
+        player_monster = PlayerMonster.objects.grant(user, monster, level=int(level), increment_existing=False)
+        if player_monster is None:
             return Response({"error": "User already has this monster"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create new player monster
-        player_monster = PlayerMonster.objects.create(
-            user=user,
-            monster=monster,
-            level=level
-        )
+        invalidate_hands(user.id)
         
         serializer = PlayerMonsterSerializer(player_monster)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -181,9 +182,30 @@ def get_all_quiz_questions(request):
         return Response({"error": "Admin privileges required"}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        questions = QuizQuestion.objects.all()
-        serializer = QuestionSerializer(questions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_list_response(request, QuizQuestion.objects.all(), QuestionSerializer)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_quiz_questions(request):
+    if not is_admin(request.user):
+        return Response({"error": "Admin privileges required"}, status=status.HTTP_403_FORBIDDEN)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"error": "Upload the questions as a file field"}, status=status.HTTP_400_BAD_REQUEST)
+    file_format = get_question_file_format(upload.name, request.data.get('format'))
+    if file_format is None:
+        return Response({"error": "format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Read a line at a time straight from the upload, so the file is never held in memory
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        result = import_questions(iter_rows(lines, file_format))
+        return Response(result, status=status.HTTP_200_OK)
+    except UnicodeDecodeError:
+        return Response({"error": "The file must be UTF-8 text"}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -243,8 +265,7 @@ def get_all_challenges(request):
     
     try:
         challenges = GameChallenge.objects.all().order_by('id')
-        serializer = GameChallengeSerializer(challenges, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_list_response(request, challenges, GameChallengeSerializer)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -263,6 +284,31 @@ def create_challenge(request):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def simulate_challenge_scores(request):
+    if not is_admin(request.user):
+        return Response({"error": "Admin privileges required"}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        samples = min(int(request.GET.get('samples', 10000)), MAX_SIMULATION_SAMPLES)
+        win_rate = float(request.GET.get('win_rate', 0.5))
+    except ValueError:
+        return Response({"error": "samples and win_rate must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    if samples < 1 or not 0 < win_rate <= 1:
+        return Response({"error": "samples must be positive and win_rate between 0 and 1"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        catalogue_types = list(Monster.objects.values_list('type', flat=True))
+        if not catalogue_types:
+            return Response({"error": "No monsters in the catalogue"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Runs in the request process, bigger runs should use the simulate_scores command
+        histograms = run_simulation(catalogue_types, samples)
+        return Response(summarise_simulation(histograms, win_rate), status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def manage_challenge(request, challenge_id):
@@ -0,0 +1,72 @@
+from django.db.models import Q
+from .models import UserProfile, Friendship
+from .rank_tree import BOARDS, count_greater
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def get_friend_ids(user):
+    # Ids of the user's accepted friends plus the user, for the friends-only boards
+    friendships = Friendship.objects.filter(
+        Q(sender=user) | Q(receiver=user),
+        status='accepted'
+    ).values_list('sender_id', 'receiver_id')
+    return {user_id for pair in friendships for user_id in pair} | {user.id}
+
+def get_board_profiles(user, scope):
+    profiles = UserProfile.objects.all()
+    if scope == 'friends':
+        profiles = profiles.filter(user_id__in=get_friend_ids(user))
+    return profiles
+
+def parse_cursor(cursor):
+    # The cursor is the value and user id of the last entry on the previous page
+    try:
+        value, user_id = (int(part) for part in cursor.split('.'))
+    except ValueError:
+        raise ValueError("cursor must be one returned by a previous page")
+    return value, user_id
+
+def count_ahead(board, scope, profiles, thresholds):
+    # Returns {threshold: number of players on the board with a higher value}. The global board
+    # reads at most 32 tree nodes per threshold in one query. A friends board is only the user's
+    # friends, so it reads their values in one query and counts them here
+    if scope == 'global':
+        return count_greater(board, thresholds)
+    values = list(profiles.values_list(BOARDS[board], flat=True))
+    return {threshold: sum(1 for value in values if value > threshold) for threshold in thresholds}
+
+def get_leaderboard_page(board, scope, profiles, cursor, page_size, my_value):
+    # Returns (entries, next cursor, the user's rank). The page is a keyset range read off the
+    # ordered index, so it costs the same however deep it is, and everyone with a higher value
+    # is ahead, so ties share a rank (1, 2, 2, 4)
+    field = BOARDS[board]
+    page = profiles.order_by(f'-{field}', 'user_id')
+    if cursor is not None:
+        value, user_id = cursor
+        page = page.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'user_id__gt': user_id}))
+    rows = list(page.values_list('user__username', 'user_id', field)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = f"{rows[-1][2]}.{rows[-1][1]}"
+
+    # Ranks on the page all follow from how many are ahead of, and level with, the first entry
+    thresholds = {my_value}
+    if rows:
+        first = rows[0][2]
+        thresholds |= {first, first - 1}
+    ahead = count_ahead(board, scope, profiles, thresholds)
+
+    entries = []
+    below_first = 0
+    for username, _, value in rows:
+        if value == first:
+            rank = ahead[first] + 1
+        elif value != entries[-1]['value']:
+            # Everyone level with or above the first entry, then those before this one on the page
+            rank = ahead[first - 1] + below_first + 1
+        if value != first:
+            below_first += 1
+        entries.append({'rank': rank, 'username': username, 'value': value})
+    return entries, next_cursor, ahead[my_value] + 1
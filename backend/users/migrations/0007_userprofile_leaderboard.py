@@ -0,0 +1,26 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_remove_userprofile_is_admin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='best_challenge_score',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-game_won_count', 'user'], name='profile_wins_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-best_challenge_score', 'user'], name='profile_score_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.19 on 2026-10-18 11:15
+
+from collections import defaultdict
+from django.db import migrations, models
+
+BOARDS = {'wins': 'game_won_count', 'score': 'best_challenge_score'}
+TREE_SIZE = 2 ** 31
+
+
+def build_leaderboard_trees(apps, schema_editor):
+    # Adds every existing profile to the trees, the same way rank_tree.move_entries would
+    UserProfile = apps.get_model('users', 'UserProfile')
+    LeaderboardNode = apps.get_model('users', 'LeaderboardNode')
+    counts = defaultdict(int)
+    for values in UserProfile.objects.values(*BOARDS.values()).iterator():
+        for board, field in BOARDS.items():
+            position = TREE_SIZE - values[field]
+            while position <= TREE_SIZE:
+                counts[(board, position)] += 1
+                position += position & -position
+    LeaderboardNode.objects.bulk_create(
+        [LeaderboardNode(board=board, position=position, count=count) for (board, position), count in counts.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_userprofile_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=10)),
+                ('position', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardnode',
+            constraint=models.UniqueConstraint(fields=('board', 'position'), name='unique_leaderboard_node'),
+        ),
+        migrations.RunPython(build_leaderboard_trees, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,47 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
+from .rank_tree import BOARDS, move_entries
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile') # include details from the user model
     game_won_count = models.PositiveIntegerField(default=0)
+    # Highest score the user has won a challenge with
+    best_challenge_score = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Ordered indexes that the leaderboard pages and ranks are read from
+        indexes = [
+            models.Index(fields=['-game_won_count', 'user'], name='profile_wins_rank_idx'),
+            models.Index(fields=['-best_challenge_score', 'user'], name='profile_score_rank_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The leaderboard trees move in the same transaction as the row, see move_leaderboard_entries
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def get_ranked_values(self):
+        return {field: getattr(self, field) for field in BOARDS.values()}
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+class LeaderboardNode(models.Model):
+    # One node of a leaderboard's Fenwick tree, see rank_tree.py. Only ever changed by
+    # move_entries when a profile is saved or deleted
+    board = models.CharField(max_length=10)
+    position = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'position'], name='unique_leaderboard_node'),
+        ]
+
 # Create a new user profile automatically when a new user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -20,8 +50,42 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    # The ranked fields are left alone, the profile here may have been loaded before a win
+    instance.profile.save(update_fields=['updated_at'])
+
+def read_ranked_values(pk):
+    # The row's current values, locked until the transaction ends so they can't change under a move
+    return UserProfile.objects.select_for_update().filter(pk=pk).values(*BOARDS.values()).first()
+
+def get_saved_boards(update_fields):
+    return {board: field for board, field in BOARDS.items() if update_fields is None or field in update_fields}
+
+# Bulk update() skips these, so the ranked fields must only be changed through save(). The old
+# values are re-read from the row rather than trusted from the instance, which may be stale
+@receiver(pre_save, sender=UserProfile)
+def remember_ranked_values(sender, instance, update_fields, **kwargs):
+    instance._ranked_values = None
+    if instance.pk is not None and get_saved_boards(update_fields):
+        instance._ranked_values = read_ranked_values(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def move_leaderboard_entries(sender, instance, created, update_fields, **kwargs):
+    old = None if created else instance._ranked_values
+    new = instance.get_ranked_values()
+    move_entries([
+        (board, old[field] if old else None, new[field])
+        for board, field in get_saved_boards(update_fields).items()
+    ])
+
+@receiver(pre_delete, sender=UserProfile)
+def remember_deleted_values(sender, instance, **kwargs):
+    # Deletes run in a transaction, so the row is still there to read
+    instance._ranked_values = read_ranked_values(instance.pk)
 
+@receiver(post_delete, sender=UserProfile)
+def remove_leaderboard_entries(sender, instance, **kwargs):
+    old = instance._ranked_values or instance.get_ranked_values()
+    move_entries([(board, old[field], None) for board, field in BOARDS.items()])
 
 class Friendship(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_friend_requests')
@@ -0,0 +1,68 @@
+from collections import defaultdict
+from django.db import connection
+
+# Leaderboard name -> UserProfile field it ranks by
+BOARDS = {
+    'wins': 'game_won_count',
+    'score': 'best_challenge_score',
+}
+# Each board is a Fenwick tree over every value a PositiveIntegerField can hold. Higher values
+# get lower positions, so the prefix sum up to a position counts the profiles ahead of it.
+# Both a rank and a move touch at most 32 nodes, however many players there are
+TREE_SIZE = 2 ** 31
+
+def tree_position(value):
+    return TREE_SIZE - value
+
+def prefix_positions(end):
+    # Nodes whose counts add up to the number of entries at positions 1..end
+    while end > 0:
+        yield end
+        end -= end & -end
+
+def update_positions(position):
+    # Nodes that include the entry at position
+    while position <= TREE_SIZE:
+        yield position
+        position += position & -position
+
+def count_greater(board, thresholds):
+    # Returns {threshold: number of profiles on the board with a value above it} in one query
+    from .models import LeaderboardNode
+    ends = {threshold: min(tree_position(threshold) - 1, TREE_SIZE) for threshold in thresholds}
+    positions = {position for end in ends.values() for position in prefix_positions(end)}
+    counts = dict(
+        LeaderboardNode.objects.filter(board=board, position__in=positions).values_list('position', 'count')
+    )
+    return {
+        threshold: sum(counts.get(position, 0) for position in prefix_positions(end))
+        for threshold, end in ends.items()
+    }
+
+def move_entries(changes):
+    # Applies [(board, old value, new value)] to the trees in one upsert. None for the old value
+    # adds an entry and None for the new one removes it. Call it inside the transaction that
+    # changes the profile so the trees can't drift from the table
+    deltas = defaultdict(int)
+    for board, old, new in changes:
+        if old == new:
+            continue
+        for value, step in ((old, -1), (new, 1)):
+            if value is not None:
+                for position in update_positions(tree_position(value)):
+                    deltas[(board, position)] += step
+    # Sorted so concurrent moves lock the nodes in the same order and can't deadlock
+    deltas = sorted((node, delta) for node, delta in deltas.items() if delta)
+    if not deltas:
+        return
+
+    from .models import LeaderboardNode
+    table = LeaderboardNode._meta.db_table
+    values = ", ".join(["(%s, %s, %s)"] * len(deltas))
+    params = [value for (board, position), delta in deltas for value in (board, position, delta)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (board, position, count) VALUES {values} "
+            f"ON CONFLICT (board, position) DO UPDATE SET count = {table}.count + excluded.count",
+            params
+        )
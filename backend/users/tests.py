@@ -1,12 +1,16 @@
 from django.test import TestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import UserProfile, Friendship
+from .rank_tree import count_greater
 from monsters.models import Monster, PlayerMonster  # Import from monsters.models
+from game.models import GameChallenge
+from quiz.models import QuizQuestion
 from unittest.mock import patch
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.urls import reverse
+import random
 
 class UserTests(APITestCase):
     def setUp(self):
@@ -149,4 +153,172 @@ class FriendshipTests(TestCase):
         
         # Check that friendship is now declined
         friendship.refresh_from_db()
-        self.assertEqual(friendship.status, 'declined')
\ No newline at end of file
+        self.assertEqual(friendship.status, 'declined')
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = {}
+        # username -> (games won, best challenge score)
+        for username, wins, best in [('alice', 5, 300), ('bob', 9, 120), ('carol', 5, 450), ('dave', 1, 80), ('erin', 0, 0)]:
+            user = User.objects.create_user(username=username, password='testpass123')
+            # Saved rather than updated so the leaderboard trees see the values
+            user.profile.game_won_count = wins
+            user.profile.best_challenge_score = best
+            user.profile.save()
+            self.users[username] = user
+
+        Friendship.objects.create(sender=self.users['alice'], receiver=self.users['dave'], status='accepted')
+        Friendship.objects.create(sender=self.users['carol'], receiver=self.users['alice'], status='pending')
+
+        self.client.force_authenticate(user=self.users['alice'])
+        self.url = reverse('leaderboard')
+
+    def test_global_wins_with_ties(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ranks = [(entry['username'], entry['rank']) for entry in response.data['results']]
+        self.assertEqual(ranks, [('bob', 1), ('alice', 2), ('carol', 2), ('dave', 4), ('erin', 5)])
+        self.assertEqual(response.data['me'], {'rank': 2, 'value': 5})
+
+    def test_ties_across_pages(self):
+        first_page = self.client.get(self.url, {'page_size': 2})
+        response = self.client.get(self.url, {'page_size': 2, 'cursor': first_page.data['next_cursor']})
+
+        ranks = [(entry['username'], entry['rank']) for entry in response.data['results']]
+        self.assertEqual(ranks, [('carol', 2), ('dave', 4)])
+        last_page = self.client.get(self.url, {'page_size': 2, 'cursor': response.data['next_cursor']})
+        self.assertEqual([(entry['username'], entry['rank']) for entry in last_page.data['results']], [('erin', 5)])
+        self.assertIsNone(last_page.data['next_cursor'])
+
+    def test_score_board(self):
+        response = self.client.get(self.url, {'board': 'score', 'page_size': 2})
+
+        self.assertEqual([entry['username'] for entry in response.data['results']], ['carol', 'alice'])
+        self.assertEqual(response.data['me']['rank'], 2)
+
+    def test_friends_only(self):
+        # Pending requests don't count as friends
+        response = self.client.get(self.url, {'scope': 'friends'})
+
+        self.assertEqual([entry['username'] for entry in response.data['results']], ['alice', 'dave'])
+        self.assertEqual(response.data['me']['rank'], 1)
+
+    def test_page_query_count(self):
+        # The user's profile, the page and the tree nodes for every rank on it, however deep
+        self.client.force_authenticate(user=User.objects.get(username='alice'))
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'page_size': 3})
+        self.client.force_authenticate(user=User.objects.get(username='alice'))
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'page_size': 3, 'cursor': response.data['next_cursor']})
+
+    def test_tree_ranks_follow_changes(self):
+        rng = random.Random(5)
+        for index in range(40):
+            user = User.objects.create_user(username=f'ranked{index}', password='testpass123')
+            user.profile.game_won_count = rng.randrange(10)
+            user.profile.save()
+        for profile in UserProfile.objects.order_by('?')[:15]:
+            profile.game_won_count = rng.randrange(10)
+            profile.save()
+        User.objects.filter(username__in=['ranked3', 'bob']).delete()
+
+        for value in range(-1, 11):
+            expected = UserProfile.objects.filter(game_won_count__gt=value).count()
+            self.assertEqual(count_greater('wins', [value])[value], expected)
+
+    def test_stale_saves_keep_tree_consistent(self):
+        # A user loaded before a win, then saved, mustn't undo the win
+        stale_user = User.objects.get(username='erin')
+        self.assertEqual(stale_user.profile.game_won_count, 0)
+        profile = UserProfile.objects.get(user__username='erin')
+        profile.game_won_count = 7
+        profile.save()
+        stale_user.first_name = 'Erin'
+        stale_user.save()
+        self.assertEqual(UserProfile.objects.get(user__username='erin').game_won_count, 7)
+
+        # A stale profile saved in full moves the tree from the row's values, not the loaded ones
+        stale_profile = UserProfile.objects.get(user__username='dave')
+        fresh = UserProfile.objects.get(user__username='dave')
+        fresh.game_won_count = 8
+        fresh.save()
+        stale_profile.game_won_count = 2
+        stale_profile.save()
+        # And a delete removes the row's values, not the stale instance's
+        stale_carol = UserProfile.objects.get(user__username='carol')
+        fresh = UserProfile.objects.get(user__username='carol')
+        fresh.game_won_count = 6
+        fresh.save()
+        stale_carol.delete()
+
+        for value in range(-1, 11):
+            expected = UserProfile.objects.filter(game_won_count__gt=value).count()
+            self.assertEqual(count_greater('wins', [value])[value], expected)
+
+    def test_invalid_board(self):
+        response = self.client.get(self.url, {'board': 'losses'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_challenge_win_updates_best_score(self):
+        monster = Monster.objects.create(name='LeaderMonster', type='HWB', rarity='C')
+        player_monster = PlayerMonster.objects.create(user=self.users['erin'], monster=monster, level=10)
+        challenge = GameChallenge.objects.create(name='Easy', target_score=1)
+        self.client.force_authenticate(user=self.users['erin'])
+
+        response = self.client.post(
+            reverse('submit-challenge-attempt'),
+            {'challenge_id': challenge.id, 'monster_ids': [player_monster.id]},
+            format='json'
+        )
+
+        profile = UserProfile.objects.get(user=self.users['erin'])
+        self.assertEqual(profile.game_won_count, 1)
+        self.assertEqual(profile.best_challenge_score, response.data['score'])
+
+class ConditionalCatalogueTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='catalogueadmin', password='adminpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+        self.monster = Monster.objects.create(name='Splash', type='W', rarity='C')
+        self.challenge = GameChallenge.objects.create(name='Easy', target_score=100)
+        QuizQuestion.objects.create(
+            question_text='Q?', choice1='a', choice2='b', choice3='c', choice4='d', answer=0, type='W'
+        )
+
+    def test_unchanged_catalogues_not_modified(self):
+        for name in ['admin-get-all-monsters', 'admin-get-all-quiz-questions', 'admin-get-all-challenges']:
+            url = reverse(name)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_edit_and_create_change_etag(self):
+        url = reverse('admin-get-all-monsters')
+        etag = self.client.get(url)['ETag']
+
+        self.monster.name = 'Splasher'
+        self.monster.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['name'], 'Splasher')
+
+        url = reverse('admin-get-all-challenges')
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('admin-create-challenge'), {'name': 'Hard', 'target_score': 500}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_non_admin_forbidden_before_etag_check(self):
+        etag = self.client.get(reverse('admin-get-all-monsters'))['ETag']
+        self.client.force_authenticate(user=User.objects.create_user(username='player', password='playerpass123'))
+
+        response = self.client.get(reverse('admin-get-all-monsters'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
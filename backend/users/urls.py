@@ -13,6 +13,7 @@ urlpatterns = [
     path('search-user/', views.search_user, name='search-user'),
     path('profile/<str:username>/', views.view_user_profile, name='view-user-profile'),
     path('me/', views.me, name='me'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
     
     # Admin routes
     path('admin/users/', admin_views.get_all_users, name='admin-get-all-users'),
@@ -24,10 +25,12 @@ urlpatterns = [
     path('admin/player-monsters/<int:player_monster_id>/', admin_views.update_player_monster, name='admin-update-player-monster'),
     path('admin/player-monsters/<int:player_monster_id>/delete/', admin_views.delete_player_monster, name='admin-delete-player-monster'),
     path('admin/quiz-questions/', admin_views.get_all_quiz_questions, name='admin-get-all-quiz-questions'),
+    path('admin/quiz-questions/import/', admin_views.import_quiz_questions, name='admin-import-quiz-questions'),
     path('admin/locations/', admin_views.get_locations_with_monsters, name='admin-get-locations-with-monsters'),
     path('admin/locations/create/', admin_views.create_location_with_monster, name='admin-create-location-with-monster'),
     path('check-admin/', admin_views.check_admin_status, name='check-admin-status'),
     path('admin/challenges/', admin_views.get_all_challenges, name='admin-get-all-challenges'),
     path('admin/challenges/create/', admin_views.create_challenge, name='admin-create-challenge'),
+    path('admin/challenges/simulate/', admin_views.simulate_challenge_scores, name='admin-simulate-challenge-scores'),
     path('admin/challenges/<int:challenge_id>/', admin_views.manage_challenge, name='admin-manage-challenge'),
 ]
@@ -5,8 +5,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import UserSerializer, FriendshipSerializer
 from .models import User, Friendship
 from django.db.models import Q
-from monsters.models import PlayerMonster
-from monsters.serializers import PlayerMonsterSerializer
+from monsters.listing import parse_listing_params, list_player_monsters, serialize_player_monsters
+from .leaderboard import BOARDS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_board_profiles, get_leaderboard_page, parse_cursor
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -212,14 +212,21 @@ def view_user_profile(request, username):
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        try:
+            options = parse_listing_params(request.GET)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         serializer = UserSerializer(user)
         
-        player_monsters = PlayerMonster.objects.filter(user=user)
-        monster_serializer = PlayerMonsterSerializer(player_monsters, many=True)
+        # Same filters, ordering, fields and paging as get-player-monsters
+        player_monsters, next_cursor = list_player_monsters(user, options)
         
         # Combine user data with monster data
         response_data = serializer.data
-        response_data['monsters'] = monster_serializer.data
+        response_data['monsters'] = serialize_player_monsters(player_monsters, options)
+        if options['paginate']:
+            response_data['monsters_next_cursor'] = next_cursor
         
         return Response(response_data, status=status.HTTP_200_OK)
         
@@ -233,3 +240,45 @@ def view_user_profile(request, username):
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard(request):
+    board = request.GET.get('board', 'wins')
+    scope = request.GET.get('scope', 'global')
+    if board not in BOARDS or scope not in ('global', 'friends'):
+        return Response(
+            {'error': f'board must be one of {", ".join(BOARDS)} and scope global or friends'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response(
+            {'error': 'page_size must be a number'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        # Pages follow on with the next_cursor of the one before
+        cursor = parse_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        profiles = get_board_profiles(request.user, scope)
+        my_value = getattr(request.user.profile, BOARDS[board])
+        results, next_cursor, my_rank = get_leaderboard_page(board, scope, profiles, cursor, page_size, my_value)
+
+        return Response({
+            'board': board,
+            'scope': scope,
+            'results': results,
+            'next_cursor': next_cursor,
+            'me': {'rank': my_rank, 'value': my_value},
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )